@@ -0,0 +1,140 @@
+import hashlib
+import os
+import numpy as np
+from scipy.fft import rfft, rfftfreq
+from file_utils import write_atomically
+from instrumentation import timings
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ear_training', 'activity')
+# Hop between energy frames, in seconds
+FRAME_SECONDS = 0.1
+# Frames analysed per chunk while building the index
+CHUNK_FRAMES = 600
+# A frame is active when its energy is within this many dB of the loud (95th percentile) frames
+ACTIVITY_THRESHOLD_DB = -30
+# A window is active when at least this fraction of its frames is active
+ACTIVE_FRACTION = 0.8
+# A frame is active in a band when the band also holds at least this share of the frame's energy (in dB)
+BAND_SHARE_DB = -20
+# Bumped when the stored arrays change meaning, so older cached indexes are rebuilt
+INDEX_VERSION = 2
+
+
+class ActivityIndex:
+    """
+    Frame-energy index of an audio file, used to pick clips that are not silent.
+
+    Holds the mean-square energy of every `FRAME_SECONDS` frame and, when bands are
+    given, each band's share of it (same units; the bands of a frame add up
+    to about its energy). A frame is active when its energy is within
+    `threshold_db` of the loud frames of the file; in a band, the band's
+    energy must also be within `threshold_db` of those loud frames and hold
+    at least `BAND_SHARE_DB` of the frame's own energy, so spectral leakage
+    from other bands does not count. ``random_start`` samples only among the
+    windows with at least `ACTIVE_FRACTION` active frames; the valid starts
+    are computed once per window length and band, so each round is an O(1)
+    draw.
+
+    Parameters:
+    sample_rate (int): Sample rate of the indexed file.
+    hop (int): Frame length in samples.
+    energy (np.ndarray): Mean square of every frame.
+    band_energy (np.ndarray): ``(frames, bands)`` mean-square energy per band, or None.
+    """
+
+    def __init__(self, sample_rate, hop, energy, band_energy=None, threshold_db=ACTIVITY_THRESHOLD_DB):
+        self.sample_rate = sample_rate
+        self.hop = hop
+        self.energy = energy
+        self.band_energy = band_energy
+        self.threshold_db = threshold_db
+        self._starts = {}
+
+    @classmethod
+    def build(cls, source, bands=None):
+        """Scan `source` once, in chunks, and return its index."""
+        hop = int(FRAME_SECONDS * source.sample_rate)
+        n_frames = source.frames // hop
+        energy = np.zeros(n_frames)
+        band_energy = np.zeros((n_frames, len(bands))) if bands else None
+        if bands:
+            # First FFT bin of each band, for a vectorised sum with np.add.reduceat
+            freqs = rfftfreq(hop, 1 / source.sample_rate)
+            edges = np.searchsorted(freqs, [edge for band in bands for edge in band])
+            # Hann window against leakage into empty bands; the scale turns one-sided
+            # spectral power into mean-square energy (Parseval), comparable to `energy`
+            window = np.hanning(hop)
+            scale = 2 / (hop * np.sum(window ** 2))
+        with timings.stage('activity.build', frames=source.frames):
+            for first in range(0, n_frames, CHUNK_FRAMES):
+                count = min(CHUNK_FRAMES, n_frames - first)
+                frames = source.read(first * hop, count * hop).reshape(count, hop)
+                energy[first:first + count] = np.mean(np.square(frames, dtype=np.float64), axis=1)
+                if bands:
+                    power = np.abs(rfft(frames * window, axis=1)) ** 2 * scale
+                    # reduceat sums [edge_low, edge_high) for even positions; odd positions are gaps
+                    sums = np.add.reduceat(np.pad(power, ((0, 0), (0, 1))), edges, axis=1)
+                    band_energy[first:first + count] = sums[:, ::2]
+        return cls(source.sample_rate, hop, energy, band_energy)
+
+    @classmethod
+    def for_source(cls, source, bands=None, cache_dir=DEFAULT_CACHE_DIR):
+        """Return the index of `source`, from the on-disk cache when the file has not changed."""
+        stat = os.stat(source.path)
+        key = (f"{os.path.abspath(source.path)}|{stat.st_size}|{stat.st_mtime_ns}|{source.sample_rate}|{bands}"
+               f"|{INDEX_VERSION}")
+        cache_file = os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest() + '.npz')
+        try:
+            with np.load(cache_file) as cached:
+                band_energy = cached['band_energy'] if 'band_energy' in cached else None
+                return cls(int(cached['sample_rate']), int(cached['hop']), cached['energy'], band_energy)
+        except (OSError, KeyError, ValueError):
+            pass
+
+        index = cls.build(source, bands)
+        arrays = {'sample_rate': index.sample_rate, 'hop': index.hop, 'energy': index.energy}
+        if index.band_energy is not None:
+            arrays['band_energy'] = index.band_energy
+        write_atomically(cache_file, lambda f: np.savez(f, **arrays))
+        return index
+
+    def active_frames(self, band=None):
+        """Return the boolean mask of the active frames (in `band`, when given)."""
+        # Digital silence is left out of the reference, so mostly silent files still find their active part
+        audible = self.energy[self.energy > 0]
+        if len(audible) == 0:
+            return np.zeros(len(self.energy), dtype=bool)
+        floor = np.percentile(audible, 95) * 10 ** (self.threshold_db / 10)
+        if band is None:
+            return self.energy >= floor
+        band_energy = self.band_energy[:, band]
+        return (band_energy >= floor) & (band_energy >= self.energy * 10 ** (BAND_SHARE_DB / 10))
+
+    def _valid_starts(self, length, band):
+        """Frame indices where a `length`-sample window has at least `ACTIVE_FRACTION` active frames."""
+        window = max(1, -(-length // self.hop))
+        active = self.active_frames(band)
+        if len(active) < window:
+            return np.zeros(0, dtype=np.int64)
+        # Active frames in every window, from a running sum
+        cumulative = np.concatenate(([0], np.cumsum(active, dtype=np.int64)))
+        return np.flatnonzero(cumulative[window:] - cumulative[:-window] >= ACTIVE_FRACTION * window)
+
+    def random_start(self, length, rng=np.random, band=None):
+        """
+        Return a random start sample for an active `length`-sample window, or None if there is none.
+
+        When no window is active in `band` (or the index has no bands), the
+        windows active overall are used instead.
+        """
+        if self.band_energy is None:
+            band = None
+        key = (length, band)
+        if key not in self._starts:
+            self._starts[key] = self._valid_starts(length, band)
+        starts = self._starts[key]
+        if len(starts) == 0 and band is not None:
+            return self.random_start(length, rng)
+        if len(starts) == 0:
+            return None
+        return int(starts[rng.randint(0, len(starts))]) * self.hop
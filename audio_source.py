@@ -0,0 +1,118 @@
+import threading
+import numpy as np
+import soundfile as sf
+from instrumentation import timings
+
+# Default length of the clip used in each training round
+CLIP_SECONDS = 5
+# Sample format of decoded audio and of every round buffer
+AUDIO_DTYPE = np.float32
+# Formats libsndfile seeks in cheaply; anything else goes through the decoded-audio cache
+SEEKABLE_FORMATS = ('WAV', 'WAVEX', 'AIFF', 'RF64', 'W64', 'CAF')
+
+
+class ClipSource:
+    """
+    Lazy reader that decodes only the frames a training clip needs.
+
+    The file is opened through its header (``sf.info``), so opening costs the
+    same whatever the length of the recording. Each call to ``read`` seeks to
+    the requested window, decodes just those frames and downmixes them to mono.
+
+    Compressed files (FLAC, OGG, ...) can instead be served from a
+    `DecodedAudioCache`: they are decoded once and later opens memory-map
+    the cached PCM.
+
+    Parameters:
+    path (str): Path to the audio file.
+    dtype (np.dtype): Sample format of the decoded clips.
+    cache (DecodedAudioCache): Optional cache for compressed formats.
+
+    Attributes:
+    activity (ActivityIndex): When set, random clips are drawn only from active windows.
+    """
+
+    def __init__(self, path, dtype=AUDIO_DTYPE, cache=None):
+        with timings.stage('file.open'):
+            self._open(path, dtype, cache)
+
+    def _open(self, path, dtype, cache):
+        info = sf.info(path)
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.sample_rate = info.samplerate
+        self.frames = info.frames
+        self.channels = info.channels
+        self._file = None
+        self._pcm = None
+        self.activity = None
+        if cache is not None and info.format not in SEEKABLE_FORMATS:
+            self._pcm = cache.load(path)
+            self.frames = len(self._pcm)
+        else:
+            self._file = sf.SoundFile(path)
+        # SoundFile keeps a single read position, so seek+read must be atomic
+        self._lock = threading.Lock()
+        # Multichannel frames are decoded here before the downmix; grown on demand
+        self._scratch = np.empty((0, self.channels), dtype=self.dtype)
+
+    def read(self, start, length, out=None):
+        """
+        Return `length` mono frames starting at `start`, zero-padded past the end of the file.
+
+        When `out` is given the frames are decoded straight into it.
+        """
+        start = int(start)
+        length = int(length)
+        if out is None:
+            out = np.empty(length, dtype=self.dtype)
+        available = max(0, min(length, self.frames - start))
+        read = 0
+        if available and self._pcm is not None:
+            # Already mono in the memory-mapped cache
+            out[:available] = self._pcm[start:start + available]
+            read = available
+        elif available:
+            with self._lock:
+                self._file.seek(start)
+                if self.channels == 1:
+                    read = len(self._file.read(out=out[:available]))
+                else:
+                    if len(self._scratch) < available:
+                        self._scratch = np.empty((available, self.channels), dtype=self.dtype)
+                    data = self._file.read(out=self._scratch[:available])
+                    read = len(data)
+                    # Downmix only the window that was read
+                    np.mean(data, axis=1, out=out[:read])
+        out[read:] = 0
+        return out
+
+    def random_clip(self, seconds=CLIP_SECONDS, rng=np.random, out=None, band=None):
+        """
+        Pick a random window of `seconds` and return ``(start, clip)``, decoding into `out` if given.
+
+        With an activity index, only windows with enough energy (in `band`,
+        when given) are picked.
+        """
+        length = int(seconds * self.sample_rate)
+        max_start = max(0, self.frames - length)
+        start = None
+        if self.activity is not None:
+            start = self.activity.random_start(length, rng, band)
+        if start is not None:
+            start = min(start, max_start)
+        elif max_start <= 0:
+            start = 0
+        else:
+            start = rng.randint(0, max_start)
+        return start, self.read(start, length, out)
+
+    def locate(self, start):
+        """Return ``(path, seconds)`` for frame `start`; see ``CorpusSource.locate``."""
+        return self.path, start / self.sample_rate
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self._pcm = None
@@ -0,0 +1,171 @@
+"""
+Headless generator of training exercises.
+
+Renders N rounds per trainer (EQ, panning, reverb) from a corpus of audio
+files, in parallel across cores, and writes the original/altered clips plus
+an answer manifest. Every round has its own seed derived from ``--seed``, so
+the same command always produces the same exercises.
+
+Example:
+    python batch_generator.py my_corpus/ exercises/ --rounds 30 --seed 42
+    python batch_generator.py my_corpus/ exercises/ --types pan --pan-sources 4 --pan-law compromise
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import numpy as np
+import soundfile as sf
+from activity_index import ActivityIndex
+from audio_source import ClipSource
+from convolution import available_irs
+from decode_cache import DecodedAudioCache
+from file_utils import scan_audio_files
+from filter_bank import BandFilterBank, band_label, eq_bands
+from ir_cache import IRCache
+from panning import DEFAULT_PAN_LAW, PAN_LAWS, PanningEngine, multi_pan_round
+from rounds import eq_round, pan_round, reverb_round
+
+EXERCISE_TYPES = ('eq', 'pan', 'reverb')
+
+
+def find_audio_files(corpus):
+    """Return the audio files of `corpus` (a file or a directory), in a stable order."""
+    if os.path.isfile(corpus):
+        return [corpus]
+    return sorted(scan_audio_files(corpus))
+
+
+# Per-process state: the corpus is sent once per worker and each file or
+# filter bank is opened/built only once per worker
+_files = []
+_output_dir = '.'
+_pan_law = DEFAULT_PAN_LAW
+_pan_sources = 1
+
+
+def _init_worker(files, output_dir, pan_law=DEFAULT_PAN_LAW, pan_sources=1):
+    global _files, _output_dir, _pan_law, _pan_sources
+    _files = files
+    _output_dir = output_dir
+    _pan_law = pan_law
+    _pan_sources = pan_sources
+
+
+@lru_cache(maxsize=None)
+def _source(path):
+    source = ClipSource(path, cache=DecodedAudioCache())
+    source.activity = ActivityIndex.for_source(source, eq_bands(source.sample_rate))
+    return source
+
+
+@lru_cache(maxsize=None)
+def _filter_bank(sample_rate):
+    return BandFilterBank(eq_bands(sample_rate), sample_rate)
+
+
+@lru_cache(maxsize=None)
+def _convolvers(sample_rate):
+    cache = IRCache()
+    return {name: cache.prepare(path, sample_rate)[1] for name, path in available_irs().items()}
+
+
+def render_exercise(job):
+    """Render one exercise described by `job` and return its manifest entry."""
+    index, kind, seed = job
+    rng = np.random.RandomState(seed)
+    source = _source(_files[rng.randint(0, len(_files))])
+    if kind == 'eq':
+        round_ = eq_round(source, _filter_bank(source.sample_rate), rng)
+        answer = {'band': int(round_.answer), 'label': band_label(eq_bands(source.sample_rate)[round_.answer])}
+    elif kind == 'pan' and _pan_sources > 1:
+        round_ = multi_pan_round(source, _pan_sources, _pan_law, rng)
+        answer = {'positions': [int(position) for position in round_.answer], 'law': _pan_law}
+    elif kind == 'pan':
+        round_ = pan_round(source, rng, engine=PanningEngine(_pan_law))
+        answer = {'position': int(round_.answer), 'law': _pan_law}
+    else:
+        round_ = reverb_round(source, _convolvers(source.sample_rate), rng)
+        answer = {'reverb': str(round_.answer)}
+
+    name = f"{kind}_{index:04d}"
+    original_file = f"{name}_original.wav"
+    altered_file = f"{name}_altered.wav"
+    sf.write(os.path.join(_output_dir, original_file), round_.original, source.sample_rate)
+    sf.write(os.path.join(_output_dir, altered_file), round_.altered, source.sample_rate)
+    # A multi-source exercise has one start per stem, in stem order
+    starts = round_.start if isinstance(round_.start, list) else [round_.start]
+    entry = {
+        'id': name,
+        'type': kind,
+        'seed': int(seed),
+        'source': source.path,
+        'start': int(starts[0]),
+        'sample_rate': source.sample_rate,
+        'original': original_file,
+        'altered': altered_file,
+        'answer': answer,
+    }
+    if len(starts) > 1:
+        entry['starts'] = [int(start) for start in starts]
+    return entry
+
+
+def generate_exercises(corpus, output_dir, rounds, types=EXERCISE_TYPES, seed=0, workers=None,
+                       pan_law=DEFAULT_PAN_LAW, pan_sources=1):
+    """
+    Render `rounds` exercises of each of `types` from `corpus` into `output_dir`.
+
+    Panning exercises use `pan_law`; with `pan_sources` above 1 each one mixes
+    that many clips, every one panned to its own position.
+
+    Returns the manifest entries, in job order, and writes them to
+    ``manifest.json`` in `output_dir`.
+    """
+    files = find_audio_files(corpus)
+    if not files:
+        raise ValueError(f"No audio files found in '{corpus}'.")
+    if 'reverb' in types:
+        # Fail here, with the expected paths, rather than in every worker
+        available_irs()
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs = [(index, kind) for kind in types for index in range(rounds)]
+    # One independent, reproducible seed per exercise
+    seeds = np.random.SeedSequence(seed).generate_state(len(jobs))
+    jobs = [(index, kind, job_seed) for (index, kind), job_seed in zip(jobs, seeds)]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(files, output_dir, pan_law, pan_sources)) as executor:
+        manifest = list(executor.map(render_exercise, jobs, chunksize=max(1, len(jobs) // 64)))
+
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+        json.dump({'seed': seed, 'corpus': corpus, 'exercises': manifest}, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render ear training exercises to disk.")
+    parser.add_argument('corpus', help="Audio file or directory of audio files.")
+    parser.add_argument('output_dir', help="Directory for the rendered clips and manifest.json.")
+    parser.add_argument('--rounds', type=int, default=10, help="Exercises per type (default: 10).")
+    parser.add_argument('--types', nargs='+', choices=EXERCISE_TYPES, default=list(EXERCISE_TYPES))
+    parser.add_argument('--seed', type=int, default=0, help="Seed for reproducible exercises.")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores).")
+    parser.add_argument('--pan-law', choices=PAN_LAWS, default=DEFAULT_PAN_LAW,
+                        help=f"Pan law of the panning exercises (default: {DEFAULT_PAN_LAW}).")
+    parser.add_argument('--pan-sources', type=int, default=1,
+                        help="Clips mixed per panning exercise, each at its own position (default: 1).")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    manifest = generate_exercises(args.corpus, args.output_dir, args.rounds, args.types, args.seed, args.workers,
+                                  args.pan_law, args.pan_sources)
+    elapsed = time.perf_counter() - start
+    print(f"{len(manifest)} rounds in {elapsed:.2f} s ({len(manifest) / elapsed:.1f} rounds/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Benchmarks for the trainers' DSP hot paths.
+
+Runs clip selection, the EQ, panning and reverb round renders and IR
+extraction headlessly on synthetic audio, across clip lengths, sample rates,
+channel counts and the IRs bundled in ``IRs/``. Reports wall time, rounds per
+second and peak traced memory, saves the results as JSON and, given a
+baseline, flags every case that got slower.
+
+Example:
+    python benchmark.py --output baseline.json
+    python benchmark.py --baseline baseline.json --tolerance 0.15
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import soundfile as sf
+from scipy.signal import fftconvolve
+from audio_source import ClipSource
+from convolution import available_irs
+from filter_bank import BandFilterBank, eq_bands
+from ir_cache import IRCache
+from ir_generator import extract_ir
+from rounds import BufferRing, eq_round, pan_round, reverb_round
+
+SAMPLE_RATES = (44100, 48000, 96000)
+CHANNEL_COUNTS = (1, 2)
+CLIP_LENGTHS = (1, 5, 20)
+# Length of the synthetic source files, in seconds
+SOURCE_SECONDS = 60
+
+
+def measure(function, repeats):
+    """Run `function` `repeats` times and return ``(median seconds, peak traced bytes)``."""
+    function()  # warm-up: file handles, filter design, FFT plans
+    times = []
+    tracemalloc.start()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return float(np.median(times)), peak
+
+
+def synthetic_file(directory, sample_rate, channels, seconds=SOURCE_SECONDS):
+    """Write `seconds` of noise to a WAV file in `directory` and return its path."""
+    path = os.path.join(directory, f"noise_{sample_rate}_{channels}ch.wav")
+    if not os.path.exists(path):
+        rng = np.random.default_rng(0)
+        sf.write(path, 0.1 * rng.standard_normal((seconds * sample_rate, channels)), sample_rate,
+                 subtype='FLOAT')
+    return path
+
+
+def benchmark_cases(directory, quick=False):
+    """Yield ``(name, params, function)`` for every benchmarked code path."""
+    rng = np.random.RandomState(0)
+    sample_rates = SAMPLE_RATES[:1] if quick else SAMPLE_RATES
+    clip_lengths = CLIP_LENGTHS[1:2] if quick else CLIP_LENGTHS
+    ir_cache = IRCache(os.path.join(directory, 'ir_cache'))
+
+    for sample_rate in sample_rates:
+        for channels in CHANNEL_COUNTS:
+            source = ClipSource(synthetic_file(directory, sample_rate, channels))
+            filter_bank = BandFilterBank(eq_bands(sample_rate), sample_rate)
+            # Reused round buffers, as in the trainers
+            buffers = BufferRing(4)
+            for seconds in clip_lengths:
+                params = {'sample_rate': sample_rate, 'channels': channels, 'clip_seconds': seconds}
+                yield 'new_clip', params, lambda s=source, n=seconds: s.random_clip(n, rng)
+                yield 'eq_round', params, lambda s=source, n=seconds, b=filter_bank: eq_round(s, b, rng, n, buffers)
+                yield 'pan_round', params, lambda s=source, n=seconds: pan_round(s, rng, n, buffers)
+                for name, path in available_irs().items():
+                    convolvers = {name: ir_cache.prepare(path, sample_rate)[1]}
+                    yield ('reverb_round', dict(params, ir=name),
+                           lambda s=source, n=seconds, c=convolvers: reverb_round(s, c, rng, n, buffers))
+
+        # IR extraction from a dry/wet pair, the work done by generate_ir
+        dry = 0.1 * np.random.default_rng(1).standard_normal(10 * sample_rate)
+        ir = np.exp(-np.arange(sample_rate) / (0.2 * sample_rate))
+        wet = fftconvolve(dry, ir)[:len(dry)]
+        yield 'generate_ir', {'sample_rate': sample_rate, 'seconds': 10}, lambda d=dry, w=wet: extract_ir(d, w)
+
+
+def run_benchmarks(repeats=5, quick=False):
+    """Run every case and return the list of result records."""
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, params, function in benchmark_cases(directory, quick):
+            seconds, peak = measure(function, repeats)
+            results.append({
+                'name': name,
+                'params': params,
+                'seconds': seconds,
+                'rounds_per_second': 1 / seconds if seconds else float('inf'),
+                'peak_bytes': peak,
+            })
+            print(f"{name:14s} {_describe(params):50s} {seconds * 1000:9.2f} ms "
+                  f"{1 / seconds:9.1f} rounds/s {peak / 2 ** 20:8.1f} MiB")
+    return results
+
+
+def _describe(params):
+    return ' '.join(f"{key}={value}" for key, value in params.items())
+
+
+def _key(result):
+    return result['name'], _describe(result['params'])
+
+
+def compare(results, baseline, tolerance):
+    """Return the results more than `tolerance` (a fraction) slower than in `baseline`."""
+    previous = {_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        reference = previous.get(_key(result))
+        if reference and result['seconds'] > reference['seconds'] * (1 + tolerance):
+            regressions.append((result, reference))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ear training DSP hot paths.")
+    parser.add_argument('--output', help="Save the results to this JSON file.")
+    parser.add_argument('--baseline', help="Compare against results saved earlier with --output.")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed slowdown against the baseline, as a fraction (default: 0.2).")
+    parser.add_argument('--repeats', type=int, default=5, help="Timed runs per case (default: 5).")
+    parser.add_argument('--quick', action='store_true', help="Only 44.1 kHz and 5-second clips.")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.repeats, args.quick)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': sys.version.split()[0],
+                'numpy': np.__version__,
+                'machine': platform.machine(),
+                'results': results,
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+        for result, reference in regressions:
+            print(f"REGRESSION {result['name']} {_describe(result['params'])}: "
+                  f"{reference['seconds'] * 1000:.2f} ms -> {result['seconds'] * 1000:.2f} ms")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+import os
+import numpy as np
+import soundfile as sf
+from scipy.fft import rfft, irfft, next_fast_len
+
+# Default IR partition length, in samples
+DEFAULT_BLOCK_SIZE = 16384
+
+# Impulse responses bundled with the reverb trainer, next to this module
+IR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'IRs')
+IR_LIBRARY = {
+    "Small Room": os.path.join(IR_DIR, "small_room_ir.wav"),
+    "Large Hall": os.path.join(IR_DIR, "large_hall_ir.wav"),
+    "Church": os.path.join(IR_DIR, "church_ir.wav")
+}
+
+
+def available_irs(library=IR_LIBRARY):
+    """Return the entries of `library` whose IR file exists; raises FileNotFoundError when none does."""
+    found = {name: path for name, path in library.items() if os.path.exists(path)}
+    if not found:
+        raise FileNotFoundError(f"No IR file found; expected {', '.join(library.values())}.")
+    return found
+
+
+def _fft_size(block_size):
+    # A B-sample block convolved with a B-sample partition is 2B - 1 samples long; the
+    # transform spans 2B so that each block's tail (its second B samples) is always whole
+    return next_fast_len(2 * block_size, real=True)
+
+
+def load_ir(path):
+    """Read an IR file, converting it to mono. Returns ``(ir, sample_rate)``."""
+    ir_data, ir_sample_rate = sf.read(path)
+    if ir_data.ndim > 1:
+        ir_data = np.mean(ir_data, axis=1)
+    return ir_data, ir_sample_rate
+
+
+class PartitionedConvolver:
+    """
+    Uniform-partitioned overlap-add convolution with a precomputed IR spectrum.
+
+    The impulse response is split into partitions of `block_size` samples and
+    each partition is transformed once, when the convolver is built. Rendering
+    a clip then only costs the forward FFT of the clip blocks, a multiply-add
+    per partition and the inverse FFT of the output blocks. Only the output
+    samples that are requested are computed, so the reverb tail past the end
+    of the clip costs nothing.
+
+    Parameters:
+    ir (np.ndarray): Mono impulse response.
+    block_size (int): Partition length in samples.
+    """
+
+    def __init__(self, ir, block_size=DEFAULT_BLOCK_SIZE):
+        ir = np.asarray(ir, dtype=float)
+        self.block_size = block_size
+        self.fft_size = _fft_size(block_size)
+        n_partitions = max(1, -(-len(ir) // block_size))
+        padded = np.zeros(n_partitions * block_size)
+        padded[:len(ir)] = ir
+        self.partitions = rfft(padded.reshape(n_partitions, block_size), n=self.fft_size, axis=1)
+
+    @classmethod
+    def from_partitions(cls, partitions, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Build a convolver from IR partition spectra computed earlier (e.g. loaded from a cache).
+
+        Raises ValueError when the spectra were not computed for `block_size`.
+        """
+        convolver = cls.__new__(cls)
+        convolver.block_size = block_size
+        convolver.fft_size = _fft_size(block_size)
+        if partitions.ndim != 2 or partitions.shape[1] != convolver.fft_size // 2 + 1:
+            raise ValueError(f"IR partitions of shape {partitions.shape} do not match a block size of {block_size}.")
+        convolver.partitions = partitions
+        return convolver
+
+    def transform(self, audio, length=None):
+        """
+        Return the block spectra of `audio` needed for the first `length` output samples.
+
+        The spectra only depend on the block size, so they can be shared by
+        every convolver built with the same `block_size` (see ``render_all``).
+        """
+        block = self.block_size
+        if length is None:
+            length = len(audio)
+        # Input blocks starting after the end of the output cannot contribute
+        n_in_blocks = min(-(-len(audio) // block), -(-length // block))
+        padded = np.zeros(n_in_blocks * block, dtype=audio.dtype)
+        used = min(len(audio), len(padded))
+        padded[:used] = audio[:used]
+        return rfft(padded.reshape(n_in_blocks, block), n=self.fft_size, axis=1)
+
+    def render_spectra(self, spectra, length, out=None, dtype=np.float32):
+        """Render the first `length` output samples from block spectra returned by ``transform``."""
+        block = self.block_size
+        if out is None:
+            out = np.empty(length, dtype=dtype)
+        n_out_blocks = -(-length // block)
+        n_in_blocks = min(len(spectra), n_out_blocks)
+        out[:] = 0
+        if n_out_blocks == 0 or n_in_blocks == 0:
+            return out
+
+        # Output block k is the sum of X[k - j] * H[j] over the partitions j
+        accum = np.zeros((n_out_blocks, self.partitions.shape[1]), dtype=complex)
+        for j, partition in enumerate(self.partitions[:n_out_blocks]):
+            n = min(n_in_blocks, n_out_blocks - j)
+            accum[j:j + n] += spectra[:n] * partition
+
+        blocks = irfft(accum, n=self.fft_size, axis=1)
+        # Overlap-add straight into the output: each block's second half spills into the next block
+        for k in range(n_out_blocks):
+            begin = k * block
+            head = min(block, length - begin)
+            out[begin:begin + head] += blocks[k, :head]
+            tail = min(block, length - begin - block)
+            if tail > 0:
+                out[begin + block:begin + block + tail] += blocks[k, block:block + tail]
+        return out
+
+    def render(self, audio, length=None, out=None):
+        """
+        Convolve `audio` with the IR and return only the first `length` samples.
+
+        `length` defaults to ``len(audio)``, which is what the trainers play back.
+        The result is written into `out` when given.
+        """
+        if length is None:
+            length = len(audio)
+        return self.render_spectra(self.transform(audio, length), length, out, audio.dtype)
+
+
+def render_all(convolvers, audio, out, executor=None):
+    """
+    Convolve `audio` with every convolver of `convolvers`, one row of `out` each.
+
+    The block spectra of `audio` are computed once per block size and shared
+    by all the IRs. With an `executor` (e.g. a ``ThreadPoolExecutor``) the
+    IRs are rendered concurrently; the FFTs and array products release the
+    GIL, so the threads run in parallel.
+    """
+    length = out.shape[1]
+    spectra = {}
+    for convolver in convolvers:
+        if convolver.block_size not in spectra:
+            spectra[convolver.block_size] = convolver.transform(audio, length)
+
+    def render_row(index):
+        convolver = convolvers[index]
+        return convolver.render_spectra(spectra[convolver.block_size], length, out[index])
+
+    if executor is None:
+        for index in range(len(convolvers)):
+            render_row(index)
+    else:
+        # list() waits for every row and re-raises the first error
+        list(executor.map(render_row, range(len(convolvers))))
+    return out
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import threading
+from collections import Counter, OrderedDict
+import numpy as np
+import soundfile as sf
+from audio_source import AUDIO_DTYPE, CLIP_SECONDS
+from file_utils import scan_audio_files, write_atomically
+from ir_cache import resample_ir
+from instrumentation import timings
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ear_training', 'corpus')
+# Files are decoded and cached in aligned segments of this length
+SEGMENT_SECONDS = 10
+# Default memory budget of the decoded segment cache
+DEFAULT_SEGMENT_CACHE_BYTES = 256 * 1024 ** 2
+# A clip quieter than this (mean square, about -60 dBFS) is drawn again
+SILENCE_ENERGY = 1e-6
+MAX_DRAWS = 4
+
+
+class CorpusIndex:
+    """
+    Persistent metadata index of the audio files under a directory.
+
+    Only the headers are read (``sf.info``); no audio is decoded. The index is
+    stored as JSON under `index_dir`, and ``update`` probes just the files that
+    are new or whose size or modification time changed, so re-opening a large
+    library costs one directory walk.
+
+    Parameters:
+    directory (str): Root of the library.
+    index_dir (str): Directory holding the JSON indexes.
+    """
+
+    def __init__(self, directory, index_dir=DEFAULT_INDEX_DIR):
+        self.directory = os.path.abspath(directory)
+        key = hashlib.sha1(self.directory.encode()).hexdigest()
+        self.index_file = os.path.join(index_dir, key + '.json')
+        self.entries = {}
+        try:
+            with open(self.index_file) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def update(self):
+        """Re-scan the directory, probe new or changed files and save the index; returns the number probed."""
+        found = {}
+        probed = 0
+        with timings.stage('corpus.scan'):
+            for path in scan_audio_files(self.directory):
+                rel_path = os.path.relpath(path, self.directory)
+                stat = os.stat(path)
+                entry = self.entries.get(rel_path)
+                if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+                    entry = self._probe(path, stat)
+                    probed += 1
+                found[rel_path] = entry
+        removed = len(self.entries.keys() - found.keys())
+        self.entries = found
+        if probed or removed:
+            self._save()
+        return probed
+
+    @staticmethod
+    def _probe(path, stat):
+        entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        try:
+            info = sf.info(path)
+        except RuntimeError:
+            # Unreadable files are remembered too, so they are not probed again
+            entry['frames'] = 0
+            return entry
+        entry.update(frames=info.frames, sample_rate=info.samplerate, channels=info.channels,
+                     format=info.format)
+        return entry
+
+    def _save(self):
+        write_atomically(self.index_file, lambda f: json.dump(self.entries, f), mode='w')
+
+    def files(self):
+        """Return ``(path, entry)`` for every readable file, in a stable order."""
+        return [(os.path.join(self.directory, rel_path), entry)
+                for rel_path, entry in sorted(self.entries.items()) if entry['frames'] > 0]
+
+
+class SegmentCache:
+    """
+    Bounded LRU cache of decoded mono segments, keyed by ``(path, segment)``.
+
+    Parameters:
+    max_bytes (int): Memory budget; the least recently used segments are dropped beyond it.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_SEGMENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._segments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, decode):
+        """Return the segment for `key`, calling ``decode()`` on a miss."""
+        with self._lock:
+            segment = self._segments.get(key)
+            if segment is not None:
+                self._segments.move_to_end(key)
+                return segment
+        segment = decode()
+        with self._lock:
+            if key not in self._segments:
+                self._segments[key] = segment
+                self.nbytes += segment.nbytes
+            while self.nbytes > self.max_bytes and len(self._segments) > 1:
+                _, dropped = self._segments.popitem(last=False)
+                self.nbytes -= dropped.nbytes
+        return segment
+
+
+class CorpusSource:
+    """
+    Draws training clips at random from a whole library of audio files.
+
+    Has the interface of `ClipSource` used by the round functions
+    (``sample_rate``, ``dtype``, ``random_clip``, ``close``). A clip is drawn
+    from a file chosen with probability proportional to its duration, so
+    every second of the library is equally likely. Only the `SEGMENT_SECONDS`
+    segments covering the clip are decoded, and recently used segments stay
+    in a `SegmentCache`. Files at another rate are resampled to
+    `sample_rate`, which defaults to the most common rate of the library.
+
+    Parameters:
+    directory (str): Root of the library.
+    sample_rate (int): Session sample rate (default: the most common one in the library).
+    dtype (np.dtype): Sample format of the decoded clips.
+    segment_cache (SegmentCache): Cache of decoded segments.
+    index_dir (str): Directory holding the metadata index.
+    """
+
+    def __init__(self, directory, sample_rate=None, dtype=AUDIO_DTYPE, segment_cache=None,
+                 index_dir=DEFAULT_INDEX_DIR):
+        self.path = directory
+        self.dtype = np.dtype(dtype)
+        self.index = CorpusIndex(directory, index_dir)
+        self.index.update()
+        self._files = self.index.files()
+        if not self._files:
+            raise ValueError(f"No audio files found in '{directory}'.")
+        rates = Counter(entry['sample_rate'] for _, entry in self._files)
+        self.sample_rate = sample_rate or rates.most_common(1)[0][0]
+        self.segment_cache = segment_cache or SegmentCache()
+        # Where each file starts in the library, in frames at the session rate, as if the files were
+        # laid end to end; drawing a library frame uniformly weights the files by duration
+        lengths = [entry['frames'] * self.sample_rate // entry['sample_rate'] for _, entry in self._files]
+        self._offsets = np.concatenate(([0], np.cumsum(lengths)))
+        self.frames = int(self._offsets[-1])
+
+    def __len__(self):
+        return len(self._files)
+
+    def _segment(self, path, sample_rate, number):
+        segment_frames = SEGMENT_SECONDS * sample_rate
+
+        def decode():
+            with timings.stage('corpus.decode_segment'), sf.SoundFile(path) as f:
+                f.seek(number * segment_frames)
+                data = f.read(segment_frames, dtype=self.dtype, always_2d=True)
+            return data.mean(axis=1, dtype=self.dtype) if data.shape[1] > 1 else data[:, 0]
+
+        return self.segment_cache.get((path, number), decode)
+
+    def read_file(self, path, entry, start, length, out=None):
+        """Return `length` frames of `path` from `start` (in `sample_rate` frames), zero-padded past its end."""
+        if out is None:
+            out = np.empty(length, dtype=self.dtype)
+        file_rate = entry['sample_rate']
+        # Window in the file's own rate
+        file_start = int(start * file_rate / self.sample_rate)
+        file_length = -(-length * file_rate // self.sample_rate)
+        file_end = min(entry['frames'], file_start + file_length)
+        segment_frames = SEGMENT_SECONDS * file_rate
+        parts = [self._segment(path, file_rate, number)
+                 for number in range(file_start // segment_frames, -(-file_end // segment_frames))]
+        offset = file_start % segment_frames
+        window = np.concatenate(parts)[offset:offset + file_end - file_start] if parts else out[:0]
+        if file_rate != self.sample_rate:
+            window = resample_ir(window, file_rate, self.sample_rate)
+        available = min(length, len(window))
+        out[:available] = window[:available]
+        out[available:] = 0
+        return out
+
+    def random_clip(self, seconds=CLIP_SECONDS, rng=np.random, out=None, band=None):
+        """
+        Pick a random window of `seconds` anywhere in the library and return ``(start, clip)``.
+
+        `start` is a frame of the whole library (see ``locate``). Clips that are
+        practically silent are drawn again, up to `MAX_DRAWS` times. `band`
+        is accepted for compatibility with `ClipSource` and not used.
+        """
+        length = int(seconds * self.sample_rate)
+        for _ in range(MAX_DRAWS):
+            index = np.searchsorted(self._offsets, rng.randint(0, self.frames), side='right') - 1
+            path, entry = self._files[index]
+            file_length = int(self._offsets[index + 1] - self._offsets[index])
+            start = rng.randint(0, file_length - length) if file_length > length else 0
+            clip = self.read_file(path, entry, start, length, out)
+            out = clip
+            if np.mean(np.square(clip, dtype=np.float64)) >= SILENCE_ENERGY:
+                break
+        return int(self._offsets[index]) + start, clip
+
+    def locate(self, start):
+        """Return ``(path, seconds)``: the file holding library frame `start` and the offset in it."""
+        index = np.searchsorted(self._offsets, start, side='right') - 1
+        return self._files[index][0], (start - int(self._offsets[index])) / self.sample_rate
+
+    def close(self):
+        pass
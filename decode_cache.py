@@ -0,0 +1,97 @@
+import hashlib
+import os
+import numpy as np
+import soundfile as sf
+from file_utils import atomic_path
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ear_training', 'decoded')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+# Frames decoded per step while filling a cache entry
+DECODE_BLOCK_FRAMES = 1 << 18
+
+
+class DecodedAudioCache:
+    """
+    Shared on-disk cache of decoded audio, stored as float32 ``.npy`` files.
+
+    Entries are keyed by absolute path, file size, modification time and
+    sample rate, so an edited or replaced file is decoded again. A hit is
+    opened with ``np.load(mmap_mode='r')`` and costs no decoding at all.
+    The cache is kept under `max_bytes` by deleting the least recently used
+    entries.
+
+    Parameters:
+    cache_dir (str): Directory holding the cached PCM.
+    max_bytes (int): Size limit of the cache directory.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _cache_file(self, path, info, stereo):
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{info.samplerate}"
+        layout = 'stereo' if stereo else 'mono'
+        return os.path.join(self.cache_dir, f"{hashlib.sha1(key.encode()).hexdigest()}_{layout}.npy")
+
+    def load(self, path, stereo=False):
+        """
+        Return the decoded audio of `path` as a read-only memory map.
+
+        The array is ``(frames,)`` mono, or ``(frames, 2)`` when `stereo` is
+        true (mono files are duplicated, extra channels are dropped). On a
+        miss the file is decoded block by block into the cache first.
+        """
+        info = sf.info(path)
+        cache_file = self._cache_file(path, info, stereo)
+        try:
+            pcm = np.load(cache_file, mmap_mode='r')
+            # Touch the entry so eviction sees it as recently used
+            os.utime(cache_file)
+            return pcm
+        except (OSError, ValueError):
+            pass
+
+        # Entries being written start with a dot, so eviction skips them
+        with atomic_path(cache_file, suffix='.npy', prefix='.') as tmp_file:
+            shape = (info.frames, 2) if stereo else (info.frames,)
+            pcm = np.lib.format.open_memmap(tmp_file, mode='w+', dtype=np.float32, shape=shape)
+            position = 0
+            for block in sf.blocks(path, blocksize=DECODE_BLOCK_FRAMES, dtype='float32', always_2d=True):
+                block = block[:info.frames - position]
+                end = position + len(block)
+                if stereo:
+                    pcm[position:end] = block[:, :2] if block.shape[1] > 1 else block
+                else:
+                    np.mean(block, axis=1, out=pcm[position:end])
+                position = end
+            # Header frame counts of compressed formats can overestimate the decoded length
+            pcm[position:] = 0
+            pcm.flush()
+            del pcm
+        self.evict(keep=cache_file)
+        return np.load(cache_file, mmap_mode='r')
+
+    def evict(self, keep=None):
+        """Delete the least recently used entries (except `keep`) until the cache fits in `max_bytes`."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            # Files starting with a dot are entries still being written
+            if name.endswith('.npy') and not name.startswith('.'):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if keep and os.path.join(self.cache_dir, name) == keep:
+                continue
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total -= size
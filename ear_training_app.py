@@ -1,23 +1,30 @@
 import sys
-import numpy as np
-import soundfile as sf
-from scipy.signal import butter, lfilter
-import sounddevice as sd
+from functools import partial
 from PyQt5.QtWidgets import (QApplication, QWidget, QPushButton, QLabel, QVBoxLayout,
-                             QFileDialog, QComboBox, QMessageBox, QHBoxLayout)
+                             QComboBox, QMessageBox, QHBoxLayout, QCheckBox)
 from PyQt5.QtCore import Qt
+from filter_bank import BandFilterBank, band_label, eq_bands
+from rounds import eq_round
+from streaming import eq_stream_round
+from trainer_session import TEXTS_PT, TrainerSession
 
-class EarTrainingApp(QWidget):
-    def __init__(self):
+class EarTrainingApp(TrainerSession, QWidget):
+    trainer = 'eq'
+    texts = dict(TEXTS_PT, wrong_bank='Este banco não é de exercícios de equalização.')
+    activity_bands = True
+
+    def __init__(self, resources=None):
         super().__init__()
         self.initUI()
+        # Arquivo, banco de rodadas, prefetcher e stream de saída da sessão
+        self.init_session(resources)
         self.audio_data = None
-        self.sample_rate = None
         self.modified_audio = None
         self.original_clip = None
         self.altered_band = None
         self.bands = None
-        self.clip_start = 0
+        self.filter_bank = None
+        self.band_variants = None
 
     def initUI(self):
         self.setWindowTitle('Treinamento Auditivo - Detecção de Faixa de Frequência')
@@ -25,6 +32,13 @@ class EarTrainingApp(QWidget):
         self.open_button = QPushButton('Selecionar Arquivo de Áudio', self)
         self.open_button.clicked.connect(self.open_file)
 
+        self.open_corpus_button = QPushButton('Selecionar Pasta de Áudio (Corpus)', self)
+        self.open_corpus_button.clicked.connect(self.open_corpus)
+
+        # Rodadas pré-renderizadas (python round_bank.py eq ...), tocadas direto do arquivo
+        self.open_bank_button = QPushButton('Abrir Banco de Rodadas', self)
+        self.open_bank_button.clicked.connect(self.open_bank)
+
         self.play_original_button = QPushButton('Reproduzir Áudio Original', self)
         self.play_original_button.clicked.connect(self.play_original)
         self.play_original_button.setEnabled(False)
@@ -37,6 +51,10 @@ class EarTrainingApp(QWidget):
         self.new_clip_button.clicked.connect(self.new_clip)
         self.new_clip_button.setEnabled(False)
 
+        # Exercício com o arquivo inteiro, renderizado em blocos enquanto toca
+        self.full_song_checkbox = QCheckBox('Exercício com a Música Inteira', self)
+        self.full_song_checkbox.toggled.connect(self.toggle_full_song)
+
         self.label = QLabel('Selecione a faixa de frequência alterada:', self)
 
         self.combo_box = QComboBox(self)
@@ -49,6 +67,8 @@ class EarTrainingApp(QWidget):
         # Layouts
         layout = QVBoxLayout()
         layout.addWidget(self.open_button)
+        layout.addWidget(self.open_corpus_button)
+        layout.addWidget(self.open_bank_button)
 
         h_layout = QHBoxLayout()
         h_layout.addWidget(self.play_original_button)
@@ -56,103 +76,72 @@ class EarTrainingApp(QWidget):
         layout.addLayout(h_layout)
 
         layout.addWidget(self.new_clip_button)
+        layout.addWidget(self.full_song_checkbox)
         layout.addWidget(self.label)
         layout.addWidget(self.combo_box)
         layout.addWidget(self.check_button)
 
         self.setLayout(layout)
-        self.show()
-
-    def open_file(self):
-        options = QFileDialog.Options()
-        fileName, _ = QFileDialog.getOpenFileName(self, "Selecionar Arquivo de Áudio", "",
-                                                  "Arquivos de Áudio (*.wav *.flac *.ogg)", options=options)
-        if fileName:
-            self.full_audio_data, self.sample_rate = sf.read(fileName)
-            # Se o áudio tiver mais de um canal, converte para mono
-            if len(self.full_audio_data.shape) > 1:
-                self.full_audio_data = np.mean(self.full_audio_data, axis=1)
-            # Prepara as faixas de frequência e inicializa a primeira porção
-            self.prepare_bands()
-            self.new_clip()
-            self.play_original_button.setEnabled(True)
-            self.play_modified_button.setEnabled(True)
-            self.combo_box.setEnabled(True)
-            self.check_button.setEnabled(True)
-            self.new_clip_button.setEnabled(True)
-            QMessageBox.information(self, 'Arquivo Carregado', 'O arquivo de áudio foi carregado e modificado.')
+
+    def start_session(self, source):
+        self.set_source(source)
+        # Prepara as faixas de frequência e inicializa a primeira porção
+        self.prepare_bands()
+        # Descarta as rodadas preparadas para a sessão anterior
+        self.prefetch_rounds(partial(eq_round, self.audio_source, self.filter_bank))
+        # Um banco só tem as rodadas gravadas nele, sem a música inteira
+        self.full_song_checkbox.setEnabled(self.round_bank is None)
+        self.new_clip()
+        self.play_original_button.setEnabled(True)
+        self.play_modified_button.setEnabled(True)
+        self.combo_box.setEnabled(True)
+        self.check_button.setEnabled(True)
+        self.new_clip_button.setEnabled(True)
 
     def prepare_bands(self):
-        nyquist = self.sample_rate / 2
         # Definir faixas de frequência dentro dos limites
-        self.bands = [
-            (20, 60),
-            (60, 250),
-            (250, 500),
-            (500, 1000),
-            (1000, 2000),
-            (2000, 4000),
-            (4000, 6000),
-            (6000, 10000),
-            (10000, 15000),
-            (15000, min(20000, nyquist - 1))
-        ]
+        self.bands = eq_bands(self.sample_rate)
         # Atualizar a combo box com as faixas de frequência
         self.combo_box.clear()
         for low, high in self.bands:
-            self.combo_box.addItem(f"{int(low)} - {int(high)} Hz")
+            self.combo_box.addItem(band_label((low, high)))
+        # Filtros projetados uma única vez por taxa de amostragem (em seções de segunda ordem)
+        self.filter_bank = BandFilterBank(self.bands, self.sample_rate)
 
     def new_clip(self):
-        # Selecionar uma porção aleatória de 5 segundos
-        max_start = max(0, len(self.full_audio_data) - 5 * self.sample_rate)
-        if max_start <= 0:
-            self.clip_start = 0
+        self.close_stream()
+        if self.full_song_checkbox.isChecked() and hasattr(self.audio_source, 'read'):
+            # A música inteira, filtrada bloco a bloco durante a reprodução (memória constante)
+            round_ = eq_stream_round(self.audio_source, self.filter_bank)
+            self.stream_renderer = round_.original.renderer
         else:
-            self.clip_start = np.random.randint(0, max_start)
-        clip_end = self.clip_start + 5 * self.sample_rate
-        self.audio_data = self.full_audio_data[int(self.clip_start):int(clip_end)]
-        # Garantir que a porção tenha o tamanho correto
-        if len(self.audio_data) < 5 * self.sample_rate:
-            self.audio_data = np.pad(self.audio_data, (0, int(5 * self.sample_rate - len(self.audio_data))), 'constant')
-        self.original_clip = self.audio_data.copy()
-        self.apply_random_gain()
-
-    def apply_random_gain(self):
-        # Selecionar uma faixa aleatória
-        self.altered_band = np.random.randint(0, len(self.bands))
-        low, high = self.bands[self.altered_band]
-        nyquist = self.sample_rate / 2
-        # Normalizar as frequências
-        low_norm = low / nyquist
-        high_norm = high / nyquist
-        # Evitar valores fora do intervalo (0, 1)
-        low_norm = max(low_norm, 1e-5)
-        high_norm = min(high_norm, 0.99999)
-        # Criar filtro
-        b, a = butter(4, [low_norm, high_norm], btype='band')
-        # Filtrar áudio
-        filtered_audio = lfilter(b, a, self.audio_data)
-        # Aplicar ganho
-        gain = 12  # ganho de 12 dB
-        filtered_audio *= 10**(gain / 20)
-        # Evitar clipping
-        self.modified_audio = self.audio_data + filtered_audio
-        max_val = np.max(np.abs(self.modified_audio))
-        if max_val > 1.0:
-            self.modified_audio /= max_val
+            # A próxima porção de 5 segundos (do banco, ou com todas as faixas já renderizadas pelo prefetcher)
+            round_ = self.take_round()
+        self.clip_start = round_.start
+        self.audio_data = round_.original
+        self.original_clip = round_.original
+        self.band_variants = round_.variants
+        self.altered_band = round_.answer
+        self.modified_audio = round_.altered
+        self.player.load(self.sample_rate, original=self.original_clip, modified=self.modified_audio)
 
     def play_original(self):
-        sd.play(self.original_clip, self.sample_rate)
+        self.player.play('original')
 
     def play_modified(self):
-        sd.play(self.modified_audio, self.sample_rate)
+        self.player.play('modified')
 
     def check_answer(self):
         user_choice = self.combo_box.currentIndex()
+        # Registra a resposta no histórico
+        source, offset = self.audio_source.locate(self.clip_start)
+        self.resources.results.append('eq', self.altered_band, user_choice, user_choice == self.altered_band,
+                                      source=source, offset=offset)
+        self.mark_answered()
         if user_choice == self.altered_band:
             QMessageBox.information(self, 'Resultado', 'Parabéns! Você acertou a faixa de frequência alterada.')
         else:
-            correct_band = f"{int(self.bands[self.altered_band][0])} - {int(self.bands[self.altered_band][1])} Hz"
+            correct_band = band_label(self.bands[self.altered_band])
             QMessageBox.information(self, 'Resultado',
                                     f'Você errou. A faixa alterada foi {correct_band}.')
         # Preparar nova tentativa
@@ -161,5 +150,6 @@ class EarTrainingApp(QWidget):
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     ex = EarTrainingApp()
+    ex.show()
     sys.exit(app.exec_())
 
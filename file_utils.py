@@ -0,0 +1,50 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Audio files picked up when a folder is scanned, by every tool
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.ogg', '.aiff', '.aif')
+
+
+@contextmanager
+def atomic_path(path, suffix='', prefix='tmp'):
+    """
+    Yield a temporary path next to `path`, moved onto `path` when the block completes.
+
+    Readers see either the previous file or the complete new one, never a
+    partial write. The temporary file is removed if the block raises.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_file = tempfile.mkstemp(prefix=prefix, suffix=suffix, dir=directory)
+    os.close(fd)
+    try:
+        yield tmp_file
+        os.replace(tmp_file, path)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def write_atomically(path, write, mode='wb'):
+    """
+    Write `path` with ``write(f)`` through `atomic_path`; returns whether it succeeded.
+
+    Meant for caches and indexes, where a failed write only means the data
+    is computed again later, so an OSError is not raised.
+    """
+    try:
+        with atomic_path(path, suffix=os.path.splitext(path)[1]) as tmp_file:
+            with open(tmp_file, mode) as f:
+                write(f)
+        return True
+    except OSError:
+        return False
+
+
+def scan_audio_files(directory):
+    """Yield the audio files under `directory` (recursively), with `AUDIO_EXTENSIONS`."""
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                yield os.path.join(root, name)
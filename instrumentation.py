@@ -0,0 +1,119 @@
+"""
+Per-stage timing instrumentation for loading, rendering and playback.
+
+Set ``EAR_TRAINING_TIMINGS=timings.jsonl`` before starting a trainer (or
+``ir_generator``) to record how long every stage takes, one JSON object per
+line. While the variable is unset, ``timings.stage(...)`` returns a shared
+no-op context manager and nothing is measured.
+
+Summarise a recording with:
+    python instrumentation.py timings.jsonl
+"""
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import defaultdict
+import numpy as np
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, timings, name, fields):
+        self.timings = timings
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.record(self.name, time.perf_counter() - self.start, **self.fields)
+        return False
+
+
+class Timings:
+    """
+    Records stage durations and buffer sizes as JSON lines.
+
+    Records are queued and written by a background thread, so ``record`` is
+    safe to call from the audio callback.
+
+    Parameters:
+    path (str): JSON lines file to append to; ``None`` disables recording.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.enabled = path is not None
+        if self.enabled:
+            self._queue = queue.SimpleQueue()
+            self._writer = threading.Thread(target=self._write, daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+
+    def stage(self, name, **fields):
+        """Context manager timing the stage `name`; `fields` (e.g. ``frames=...``) are stored with it."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, fields)
+
+    def record(self, name, seconds, **fields):
+        if self.enabled:
+            self._queue.put(dict(fields, stage=name, seconds=seconds, time=time.time(),
+                                 thread=threading.current_thread().name))
+
+    def close(self):
+        """Write the records still queued and stop the writer thread."""
+        if self.enabled and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    def _write(self):
+        with open(self.path, 'a') as f:
+            record = self._queue.get()
+            while record is not None:
+                f.write(json.dumps(record) + '\n')
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    # Flush once the queue is drained, then wait for more
+                    f.flush()
+                    record = self._queue.get()
+
+
+timings = Timings(os.environ.get('EAR_TRAINING_TIMINGS'))
+
+
+def summarize(path):
+    """Return ``{stage: (count, mean, p95, max)}`` in seconds for a JSON lines recording."""
+    durations = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            durations[record['stage']].append(record['seconds'])
+    summary = {}
+    for stage, values in durations.items():
+        values = np.asarray(values)
+        summary[stage] = (len(values), values.mean(), np.percentile(values, 95), values.max())
+    return summary
+
+
+if __name__ == '__main__':
+    for stage, (count, mean, p95, worst) in sorted(summarize(sys.argv[1]).items()):
+        print(f"{stage:20s} {count:6d}x  mean {mean * 1000:8.2f} ms  p95 {p95 * 1000:8.2f} ms  "
+              f"max {worst * 1000:8.2f} ms")
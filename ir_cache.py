@@ -0,0 +1,87 @@
+import hashlib
+import os
+from fractions import Fraction
+import numpy as np
+from convolution import DEFAULT_BLOCK_SIZE, PartitionedConvolver, load_ir
+from file_utils import write_atomically
+from instrumentation import timings
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ear_training', 'irs')
+# Tail samples quieter than this (relative to the IR peak) are trimmed
+TAIL_THRESHOLD_DB = -80
+
+
+def file_hash(path):
+    """Return the SHA-1 of the contents of `path`."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def resample_ir(ir, source_rate, target_rate):
+    """Resample `ir` from `source_rate` to `target_rate` with a polyphase filter."""
+    if source_rate == target_rate:
+        return ir
+    # Deferred: scipy.signal is slow to import and most sessions never resample
+    from scipy.signal import resample_poly
+    ratio = Fraction(int(target_rate), int(source_rate)).limit_denominator(1000)
+    return resample_poly(ir, ratio.numerator, ratio.denominator)
+
+
+def trim_tail(ir, threshold_db=TAIL_THRESHOLD_DB):
+    """Drop the end of `ir` once it stays below `threshold_db` relative to the peak."""
+    peak = np.max(np.abs(ir))
+    if peak == 0:
+        return ir[:1]
+    above = np.flatnonzero(np.abs(ir) >= peak * 10 ** (threshold_db / 20))
+    return ir[:above[-1] + 1]
+
+
+class IRCache:
+    """
+    On-disk cache of impulse responses prepared for a session sample rate.
+
+    Each IR is decoded, converted to mono, resampled to the target rate and
+    trimmed below the noise floor once; the result and its FFT partitions are
+    stored as ``.npz`` under `cache_dir`, keyed by file hash, target rate,
+    block size and trim threshold. Later sessions only load the arrays back.
+
+    Parameters:
+    cache_dir (str): Directory holding the cached IRs.
+    threshold_db (float): Tail trim threshold relative to the IR peak.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, threshold_db=TAIL_THRESHOLD_DB):
+        self.cache_dir = cache_dir
+        self.threshold_db = threshold_db
+
+    def _cache_file(self, path, sample_rate, block_size):
+        key = f"{file_hash(path)}_{int(sample_rate)}_{block_size}_{self.threshold_db:g}"
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def prepare(self, path, sample_rate, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Return ``(ir, convolver)`` for the IR at `path`, resampled to `sample_rate`.
+
+        The prepared IR is read from the cache when present, otherwise it is
+        computed and stored there.
+        """
+        cache_file = self._cache_file(path, sample_rate, block_size)
+        try:
+            with timings.stage('ir.cache_load'), np.load(cache_file) as cached:
+                ir, partitions = cached['ir'], cached['partitions']
+            return ir, PartitionedConvolver.from_partitions(partitions, block_size)
+        except (OSError, KeyError, ValueError):
+            pass
+
+        with timings.stage('ir.decode_resample', sample_rate=sample_rate):
+            ir_data, ir_sample_rate = load_ir(path)
+            ir = trim_tail(resample_ir(ir_data, ir_sample_rate, sample_rate), self.threshold_db)
+        with timings.stage('ir.partition', frames=len(ir)):
+            convolver = PartitionedConvolver(ir, block_size)
+
+        # Write to a temporary file first so a concurrent reader never sees a partial entry
+        write_atomically(cache_file, lambda f: np.savez(f, ir=ir, partitions=convolver.partitions))
+        return ir, convolver
@@ -1,54 +1,194 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import soundfile as sf
-from scipy.signal import fftconvolve
+from scipy.fft import rfft, irfft, next_fast_len
+from instrumentation import timings
 
-def generate_ir(dry_file, wet_file, output_ir_file):
+# Wiener regularisation, relative to the mean power of the dry spectrum
+DEFAULT_REGULARIZATION = 1e-3
+# In streaming mode each dry block is this many times longer than the IR
+STREAM_BLOCK_FACTOR = 8
+
+
+def _match_channels(dry, wet):
+    """Return 2-D ``(frames, channels)`` dry/wet arrays with one dry channel per wet channel."""
+    dry = dry.reshape(len(dry), -1)
+    wet = wet.reshape(len(wet), -1)
+    if dry.shape[1] != wet.shape[1]:
+        # A mono (or differently laid out) dry signal feeds every wet channel
+        dry = np.repeat(np.mean(dry, axis=1, keepdims=True), wet.shape[1], axis=1)
+    return dry, wet
+
+
+def _wiener(cross_spectrum, dry_power, regularization):
+    return cross_spectrum / (dry_power + regularization * np.mean(dry_power, axis=0))
+
+
+def extract_ir(dry_audio, wet_audio, ir_length=None, regularization=DEFAULT_REGULARIZATION):
+    """
+    Deconvolve `wet_audio` by `dry_audio` in memory and return the IR.
+
+    Parameters:
+    dry_audio (np.ndarray): Dry signal, ``(frames,)`` or ``(frames, channels)``.
+    wet_audio (np.ndarray): Wet signal, ``(frames,)`` or ``(frames, channels)``.
+    ir_length (int): Number of IR samples to keep (default: the whole signal length).
+    regularization (float): Wiener regularisation relative to the mean dry power.
+
+    Returns:
+    np.ndarray: IR with one column per wet channel (1-D when the wet signal is mono).
+    """
+    mono = wet_audio.ndim == 1
+    min_len = min(len(dry_audio), len(wet_audio))
+    dry, wet = _match_channels(dry_audio[:min_len], wet_audio[:min_len])
+    if ir_length is None:
+        ir_length = min_len
+
+    # Zero-padding to a fast length of at least twice the signal avoids circular wrap-around
+    n_fft = next_fast_len(2 * min_len, real=True)
+    dry_fft = rfft(dry, n=n_fft, axis=0)
+    wet_fft = rfft(wet, n=n_fft, axis=0)
+    ir_fft = _wiener(wet_fft * np.conj(dry_fft), np.abs(dry_fft) ** 2, regularization)
+    impulse_response = irfft(ir_fft, n=n_fft, axis=0)[:ir_length]
+    return impulse_response[:, 0] if mono else impulse_response
+
+
+def stream_ir(dry_file, wet_file, ir_length, regularization=DEFAULT_REGULARIZATION):
+    """
+    Estimate an `ir_length`-sample IR from two files with bounded memory.
+
+    The files are read block by block. Each dry block is zero-padded past the
+    IR length and matched with the wet segment it excites (block plus tail);
+    the cross- and auto-spectra are averaged over all blocks (an H1 estimate)
+    before the Wiener division. Memory use depends on `ir_length`, not on the
+    length of the recordings.
+
+    Returns:
+    tuple: ``(impulse_response, sample_rate)``; the IR has one column per wet channel.
+    """
+    with sf.SoundFile(dry_file) as dry, sf.SoundFile(wet_file) as wet:
+        if dry.samplerate != wet.samplerate:
+            raise ValueError(f"Sample rates differ: {dry.samplerate} Hz (dry) and {wet.samplerate} Hz (wet).")
+        block = STREAM_BLOCK_FACTOR * ir_length
+        segment = block + ir_length - 1
+        n_fft = next_fast_len(segment, real=True)
+        frames = min(dry.frames, wet.frames)
+
+        cross_spectrum = 0
+        dry_power = 0
+        for start in range(0, frames, block):
+            dry.seek(start)
+            dry_block = dry.read(min(block, frames - start), always_2d=True)
+            wet.seek(start)
+            wet_segment = wet.read(min(segment, frames - start), always_2d=True)
+            dry_block, wet_segment = _match_channels(dry_block, wet_segment)
+            dry_fft = rfft(dry_block, n=n_fft, axis=0)
+            wet_fft = rfft(wet_segment, n=n_fft, axis=0)
+            cross_spectrum = cross_spectrum + wet_fft * np.conj(dry_fft)
+            dry_power = dry_power + np.abs(dry_fft) ** 2
+
+        ir_fft = _wiener(cross_spectrum, dry_power, regularization)
+        return irfft(ir_fft, n=n_fft, axis=0)[:ir_length], dry.samplerate
+
+
+def generate_ir(dry_file, wet_file, output_ir_file, ir_seconds=None, regularization=DEFAULT_REGULARIZATION):
     """
     Generate an impulse response (IR) from a dry (unprocessed) audio file and a wet (processed with reverb) audio file.
-    
+
     Parameters:
     dry_file (str): Path to the dry (unprocessed) audio file.
     wet_file (str): Path to the wet (processed with reverb) audio file.
     output_ir_file (str): Path to save the generated IR file.
-    
+    ir_seconds (float): Keep only the first `ir_seconds` of the IR. When given, the files
+        are processed block by block with bounded memory instead of being loaded whole.
+    regularization (float): Wiener regularisation relative to the mean dry power.
+
     Usage:
     ------
     To create a high-quality IR, ensure the following:
     - Both dry and wet audio files should have the same length and be well-aligned. Any mismatch or latency may affect the IR quality.
     - This method works best with stationary, linear reverbs. It may not capture time-varying reverbs (e.g., tape or modulated reverbs) accurately.
     - For capturing real room reverbs (like halls or churches), consider recording with a direct signal (e.g., using a "click" or frequency sweep) for best results.
-    
+    - Stereo files are processed channel by channel; a mono dry file feeds every wet channel.
+
     Output:
     - The IR is saved as a normalized .wav file at the specified location.
     """
-    
-    # Load dry (unprocessed) and wet (with reverb) audio
-    dry_audio, sample_rate = sf.read(dry_file)
-    wet_audio, _ = sf.read(wet_file)
-    
-    # Ensure both signals have the same length
-    min_len = min(len(dry_audio), len(wet_audio))
-    dry_audio = dry_audio[:min_len]
-    wet_audio = wet_audio[:min_len]
-
-    # Calculate the Impulse Response (IR) using deconvolution in the frequency domain
-    dry_audio_fft = np.fft.fft(dry_audio)
-    wet_audio_fft = np.fft.fft(wet_audio)
-    
-    # Avoid division by zero (adding a small constant)
-    epsilon = 1e-10
-    ir_fft = wet_audio_fft / (dry_audio_fft + epsilon)
-    
-    # Convert back to the time domain to get the IR
-    impulse_response = np.fft.ifft(ir_fft).real
+    if ir_seconds is not None:
+        sample_rate = sf.info(dry_file).samplerate
+        ir_length = int(ir_seconds * sample_rate)
+        with timings.stage('ir.stream', ir_frames=ir_length):
+            impulse_response, sample_rate = stream_ir(dry_file, wet_file, ir_length, regularization)
+    else:
+        # Load dry (unprocessed) and wet (with reverb) audio
+        with timings.stage('ir.read'):
+            dry_audio, sample_rate = sf.read(dry_file)
+            wet_audio, wet_sample_rate = sf.read(wet_file)
+        if sample_rate != wet_sample_rate:
+            raise ValueError(f"Sample rates differ: {sample_rate} Hz (dry) and {wet_sample_rate} Hz (wet).")
+        with timings.stage('ir.deconvolve', frames=len(dry_audio)):
+            impulse_response = extract_ir(dry_audio, wet_audio, regularization=regularization)
 
     # Normalize the IR to avoid clipping
     impulse_response /= np.max(np.abs(impulse_response))
 
     # Save the resulting IR
-    sf.write(output_ir_file, impulse_response, sample_rate)
+    with timings.stage('ir.write', frames=len(impulse_response)):
+        sf.write(output_ir_file, impulse_response, sample_rate)
     print(f"IR saved to {output_ir_file}")
+    return output_ir_file
+
+
+def find_ir_pairs(directory):
+    """Return ``(dry, wet, name)`` for every ``<name>_dry.*`` file with a matching ``<name>_wet.*``."""
+    files = {os.path.splitext(name)[0]: name for name in sorted(os.listdir(directory))}
+    pairs = []
+    for stem, name in files.items():
+        if stem.endswith('_dry') and stem[:-4] + '_wet' in files:
+            base = stem[:-4]
+            pairs.append((os.path.join(directory, name), os.path.join(directory, files[base + '_wet']), base))
+    return pairs
+
+
+def _generate_pair(job):
+    dry_file, wet_file, output_ir_file, ir_seconds, regularization = job
+    return generate_ir(dry_file, wet_file, output_ir_file, ir_seconds, regularization)
+
+
+def generate_ir_batch(directory, output_dir=None, ir_seconds=None, regularization=DEFAULT_REGULARIZATION,
+                      workers=None):
+    """
+    Generate an IR for every ``<name>_dry``/``<name>_wet`` pair in `directory`, in a process pool.
+
+    Each IR is saved as ``<name>_ir.wav`` in `output_dir` (default: `directory`).
+    Returns the list of written files.
+    """
+    output_dir = output_dir or directory
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(dry, wet, os.path.join(output_dir, f"{name}_ir.wav"), ir_seconds, regularization)
+            for dry, wet, name in find_ir_pairs(directory)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_generate_pair, jobs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate impulse responses from dry/wet recordings.")
+    parser.add_argument('files', nargs='*', metavar='FILE', help="dry_file wet_file output_ir_file")
+    parser.add_argument('--batch', metavar='DIR', help="Process every <name>_dry/<name>_wet pair in DIR.")
+    parser.add_argument('--output-dir', help="Output directory for --batch (default: DIR).")
+    parser.add_argument('--ir-seconds', type=float, help="Keep only the first seconds of the IR (bounded memory).")
+    parser.add_argument('--regularization', type=float, default=DEFAULT_REGULARIZATION)
+    parser.add_argument('--workers', type=int, help="Worker processes for --batch (default: all cores).")
+    args = parser.parse_args()
+
+    if args.batch:
+        generate_ir_batch(args.batch, args.output_dir, args.ir_seconds, args.regularization, args.workers)
+    elif len(args.files) == 3:
+        generate_ir(*args.files, ir_seconds=args.ir_seconds, regularization=args.regularization)
+    else:
+        parser.error("expected dry_file wet_file output_ir_file, or --batch DIR")
 
-# Example usage
-generate_ir("dry_audio.wav", "wet_audio_with_reverb.wav", "my_reverb_ir.wav")
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Single entry point for the three trainers, as tabs of one window.
+
+The window is shown before any DSP or audio module is imported: the
+trainers (and with them NumPy, SciPy and soundfile) are imported right
+after the first paint. The tabs share one `SharedResources`, so a file or
+folder opened in one tab is opened once and picked up by the other tabs,
+and the IRs are prepared once per sample rate.
+
+    python launcher.py
+    python launcher.py --startup-time    # time to window and to trainers ready, then exit
+    python launcher.py --import-time     # the same, plus the slowest imports (-X importtime)
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+# Startup times are measured from here, so they include the PyQt5 import
+_START = time.perf_counter()
+
+from PyQt5.QtWidgets import QApplication, QLabel, QTabWidget
+from PyQt5.QtCore import Qt
+
+# Slowest imports listed by --import-time
+IMPORT_REPORT_SIZE = 15
+
+
+class TrainerLauncher(QTabWidget):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle('Treinamento Auditivo')
+        self.resources = None
+        self.trainers = []
+        # Placeholder until the trainers are imported
+        placeholder = QLabel('Carregando...')
+        placeholder.setAlignment(Qt.AlignCenter)
+        self.addTab(placeholder, '')
+        self.currentChanged.connect(self.tab_changed)
+
+    def load_trainers(self):
+        """Import the trainers (and the DSP stack) and replace the placeholder with one tab each."""
+        from ear_training_app import EarTrainingApp
+        from panning_training import PanningTrainingApp
+        from resources import SharedResources
+        from reverb_training import ReverbTrainingApp
+
+        self.resources = SharedResources()
+        self.trainers = [EarTrainingApp(self.resources), PanningTrainingApp(self.resources),
+                         ReverbTrainingApp(self.resources)]
+        self.blockSignals(True)
+        self.removeTab(0)
+        for trainer, title in zip(self.trainers, ('Equalização', 'Panning', 'Reverb')):
+            self.addTab(trainer, title)
+        self.blockSignals(False)
+
+    def tab_changed(self, index):
+        # Only the visible trainer holds an output stream (a device may accept only one);
+        # a hidden trainer's stream is opened again by its next play
+        for trainer in self.trainers:
+            trainer.player.close()
+        if not self.trainers:
+            return
+        # A tab without a session starts on the audio opened in another tab
+        trainer = self.trainers[index]
+        if trainer.audio_source is None and self.resources.current is not None:
+            trainer.start_session(self.resources.current)
+
+    def closeEvent(self, event):
+        for trainer in self.trainers:
+            trainer.shutdown()
+        if self.resources is not None:
+            self.resources.close()
+        super().closeEvent(event)
+
+
+def import_report(size=IMPORT_REPORT_SIZE):
+    """Run ``--startup-time`` under ``-X importtime`` and print its output and the slowest imports."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', __file__, '--startup-time'],
+                            capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                imports.append((int(cumulative), name.strip()))
+    print(result.stdout, end='')
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1] if result.stderr else f"exit code {result.returncode}")
+    print("Slowest imports (cumulative):")
+    for microseconds, name in sorted(imports, reverse=True)[:size]:
+        print(f"{microseconds / 1000:9.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ear training: EQ, panning and reverb trainers in one window.")
+    parser.add_argument('--startup-time', action='store_true', help="Print the startup times and exit.")
+    parser.add_argument('--import-time', action='store_true', help="Also list the slowest imports.")
+    args, qt_args = parser.parse_known_args()
+    if args.import_time:
+        import_report()
+        return
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = TrainerLauncher()
+    window.show()
+    # Paint the window before the heavy imports start
+    app.processEvents()
+    window_shown = time.perf_counter()
+    window.load_trainers()
+    trainers_ready = time.perf_counter()
+
+    if args.startup_time:
+        print(f"window shown after   {(window_shown - _START) * 1000:8.1f} ms")
+        print(f"trainers ready after {(trainers_ready - _START) * 1000:8.1f} ms")
+        window.close()
+        return
+    sys.exit(app.exec_())
+
+
+if __name__ == '__main__':
+    main()
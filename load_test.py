@@ -0,0 +1,130 @@
+"""
+Scripted load test for ``session_server``.
+
+Opens `--clients` concurrent sessions against a running server; each one
+plays `--rounds` rounds (new round, stream both clips, answer) and the
+round latency, from the round request to the last byte of the altered clip,
+is reported as p50/p99.
+
+Example:
+    python session_server.py my_corpus/ &
+    python load_test.py --clients 30 --rounds 10 --format flac
+
+With ``--corpus`` the server is started in-process, so the whole test runs
+from one command:
+    python load_test.py --corpus my_corpus/ --clients 30
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import numpy as np
+from session_server import DEFAULT_PORT, ROUND_TYPES, serve
+
+
+class SessionClient:
+    """Minimal keep-alive HTTP/1.1 client for one training session."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host, port):
+        return cls(*await asyncio.open_connection(host, port))
+
+    async def request(self, method, target, payload=None):
+        """Send a request and return ``(status, headers, body)``, de-chunking streamed bodies."""
+        body = json.dumps(payload).encode() if payload is not None else b''
+        self.writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\n"
+                          f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding') == 'chunked':
+            chunks = []
+            while True:
+                size = int(await self.reader.readline(), 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                chunks.append(chunk[:-2])
+            return status, headers, b''.join(chunks)
+        return status, headers, await self.reader.readexactly(int(headers.get('content-length', 0)))
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def run_session(host, port, rounds, fmt, types, latencies):
+    client = await SessionClient.connect(host, port)
+    try:
+        for _ in range(rounds):
+            kind = random.choice(types)
+            start = time.perf_counter()
+            status, _, body = await client.request('GET', f'/round?type={kind}')
+            if status != 200:
+                raise RuntimeError(f"/round failed ({status}): {body.decode()}")
+            info = json.loads(body)
+            for clip in ('original', 'altered'):
+                status, _, body = await client.request('GET', f'/audio/{clip}?format={fmt}')
+                if status != 200:
+                    raise RuntimeError(f"/audio/{clip} failed ({status}): {body.decode()}")
+            latencies.append(time.perf_counter() - start)
+            choices = info['choices']
+            guess = random.randint(-100, 100) if kind == 'pan' else (
+                random.randrange(len(choices)) if kind == 'eq' else random.choice(choices))
+            status, _, body = await client.request('POST', '/answer', {'guess': guess})
+            if status != 200:
+                raise RuntimeError(f"/answer failed ({status}): {body.decode()}")
+    finally:
+        await client.close()
+
+
+async def load_test(host='127.0.0.1', port=DEFAULT_PORT, clients=30, rounds=10, fmt='pcm', types=ROUND_TYPES,
+                    corpus=None):
+    """Run the load test and return the round latencies, in seconds."""
+    server = None
+    if corpus is not None:
+        ready = asyncio.Event()
+        server = asyncio.create_task(serve(corpus, host, port, ready=ready))
+        await ready.wait()
+    latencies = []
+    try:
+        await asyncio.gather(*(run_session(host, port, rounds, fmt, types, latencies) for _ in range(clients)))
+    finally:
+        if server is not None:
+            server.cancel()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test a running session_server.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--clients', type=int, default=30, help="Concurrent sessions (default: 30).")
+    parser.add_argument('--rounds', type=int, default=10, help="Rounds per session (default: 10).")
+    parser.add_argument('--format', choices=('pcm', 'flac'), default='pcm')
+    parser.add_argument('--types', nargs='+', choices=ROUND_TYPES, default=list(ROUND_TYPES))
+    parser.add_argument('--corpus', help="Start a server on this corpus in-process instead of using a running one.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    latencies = np.asarray(asyncio.run(load_test(args.host, args.port, args.clients, args.rounds, args.format,
+                                                 args.types, args.corpus)))
+    elapsed = time.perf_counter() - start
+    print(f"{len(latencies)} rounds, {args.clients} clients in {elapsed:.2f} s ({len(latencies) / elapsed:.1f} rounds/s)")
+    print(f"round latency  p50 {np.percentile(latencies, 50) * 1000:8.1f} ms  "
+          f"p99 {np.percentile(latencies, 99) * 1000:8.1f} ms  max {latencies.max() * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
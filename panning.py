@@ -0,0 +1,112 @@
+from functools import lru_cache
+import numpy as np
+from audio_source import CLIP_SECONDS
+from instrumentation import timings
+from rounds import Round, buffer_set, normalize
+
+# Pan positions covered by the gain tables: -100 (full left) to 100 (full right)
+PAN_POSITIONS = np.arange(-100, 101)
+PAN_LAWS = ('constant_power', 'compromise', 'linear')
+DEFAULT_PAN_LAW = 'constant_power'
+
+
+@lru_cache(maxsize=None)
+def gain_table(law):
+    """
+    Return the ``(201, 2)`` left/right gains of every position in `PAN_POSITIONS` under `law`.
+
+    ``constant_power`` keeps ``L² + R² = 1`` (-3 dB at the centre), the
+    ``compromise`` law (-4.5 dB at the centre) is the geometric mean of the
+    constant-power and linear laws, and ``linear`` is the original law of the
+    trainer (``rounds.pan_gains``): 1.0 per side at the centre and up to 2.0
+    at the extremes.
+    """
+    x = (PAN_POSITIONS + 100) / 200
+    theta = x * np.pi / 2
+    if law == 'constant_power':
+        left, right = np.cos(theta), np.sin(theta)
+    elif law == 'compromise':
+        left, right = np.sqrt((1 - x) * np.cos(theta)), np.sqrt(x * np.sin(theta))
+    elif law == 'linear':
+        left, right = 2 * (1 - x), 2 * x
+    else:
+        raise ValueError(f"Unknown pan law '{law}'; expected one of {PAN_LAWS}.")
+    table = np.stack([left, right], axis=1)
+    table.setflags(write=False)
+    return table
+
+
+class PanningEngine:
+    """
+    Mixes any number of mono or stereo stems to stereo with one matrix multiply.
+
+    The stems are the columns of one ``(frames, channels)`` array; ``channels``
+    gives the column count of each stem (1 or 2, all mono by default). A mono
+    stem is panned with the gains of its position; a stereo stem is balanced,
+    its opposite side attenuated by the same law and its own side left at
+    unity. The gains of every position come from a precomputed table, so a
+    round only gathers a ``(channels, 2)`` matrix and the mix is a single
+    BLAS ``stems @ matrix`` whatever the number of stems.
+
+    Parameters:
+    law (str): One of `PAN_LAWS`.
+    """
+
+    def __init__(self, law=DEFAULT_PAN_LAW):
+        self.law = law
+        self.table = gain_table(law)
+
+    def gains(self, positions):
+        """Return the ``(n, 2)`` gains of `positions` (rounded to whole positions)."""
+        index = np.clip(np.rint(positions).astype(int), -100, 100) + 100
+        return self.table[index]
+
+    def gain_matrix(self, positions, channels=None):
+        """Return the ``(columns, 2)`` mixing matrix for stems at `positions` with `channels` columns each."""
+        gains = self.gains(np.atleast_1d(positions))
+        if channels is None or all(n == 1 for n in channels):
+            return gains
+        # Balance for stereo stems: relative to the centre gains, never above unity
+        balance = np.minimum(gains / self.table[100], 1)
+        rows = []
+        for stem_gains, stem_balance, n in zip(gains, balance, channels):
+            if n == 1:
+                rows.append(stem_gains)
+            else:
+                rows.extend([(stem_balance[0], 0), (0, stem_balance[1])])
+        return np.array(rows)
+
+    def mix(self, stems, positions, channels=None, out=None):
+        """
+        Return the stereo mix of `stems` ``(frames, columns)`` panned to `positions`.
+
+        The mix is scaled down when it would clip, and written into `out` when given.
+        """
+        matrix = self.gain_matrix(positions, channels).astype(stems.dtype)
+        if out is None:
+            out = np.empty((len(stems), 2), dtype=stems.dtype)
+        np.matmul(stems, matrix, out=out)
+        return normalize(out)
+
+
+def multi_pan_round(source, n_sources=3, law=DEFAULT_PAN_LAW, rng=np.random, seconds=CLIP_SECONDS, buffers=None):
+    """
+    Pick `n_sources` clips from `source` as stems and pan each to its own random position.
+
+    The original is the same stems mixed at the centre; the answer is the
+    array of positions and the round's ``start`` the list of clip starts,
+    both in stem order.
+    """
+    with timings.stage('pan.multi_round', sources=n_sources):
+        round_buffers = buffer_set(buffers, source)
+        length = int(seconds * source.sample_rate)
+        # One row per stem; the transpose is the (frames, stems) array the engine mixes
+        stems = round_buffers.get('stems', (n_sources, length))
+        with timings.stage('clip.read', frames=length * n_sources):
+            starts = [source.random_clip(seconds, rng, stem)[0] for stem in stems]
+        positions = rng.randint(-100, 101, size=n_sources)
+        engine = PanningEngine(law)
+        with timings.stage('pan.render', frames=length, sources=n_sources):
+            original = engine.mix(stems.T, np.zeros(n_sources), out=round_buffers.get('original', (length, 2)))
+            panned = engine.mix(stems.T, positions, out=round_buffers.get('altered', (length, 2)))
+    return Round(starts, original, panned, positions)
@@ -1,22 +1,28 @@
 import sys
-import numpy as np
-import soundfile as sf
-import sounddevice as sd
+from functools import partial
 from PyQt5.QtWidgets import (QApplication, QWidget, QPushButton, QLabel, QVBoxLayout,
-                             QFileDialog, QSlider, QMessageBox, QHBoxLayout, QSpinBox)
+                             QSlider, QMessageBox, QHBoxLayout, QSpinBox, QCheckBox, QComboBox)
 from PyQt5.QtCore import Qt
+from panning import DEFAULT_PAN_LAW, PAN_LAWS, PanningEngine
+from rounds import pan_round
+from streaming import pan_stream_round
+from trainer_session import TEXTS_PT, TrainerSession
 
-class PanningTrainingApp(QWidget):
-    def __init__(self):
+class PanningTrainingApp(TrainerSession, QWidget):
+    trainer = 'pan'
+    texts = dict(TEXTS_PT, wrong_bank='Este banco não é de exercícios de panning.')
+
+    def __init__(self, resources=None):
         super().__init__()
         self.initUI()
+        # Arquivo, banco de rodadas, prefetcher e stream de saída da sessão
+        self.init_session(resources)
         self.audio_data = None
-        self.sample_rate = None
         self.panned_audio = None
         self.original_clip = None
         self.panning_position = None
-        self.clip_start = 0
         self.error_margin = 10  # Margem de erro inicial padrão
+        self.pan_engine = PanningEngine(DEFAULT_PAN_LAW)  # Lei de panning (tabelas de ganho pré-calculadas)
 
     def initUI(self):
         self.setWindowTitle('Treinamento Auditivo - Detecção de Panning')
@@ -27,6 +33,14 @@ class PanningTrainingApp(QWidget):
         self.open_button = QPushButton('Selecionar Arquivo de Áudio', self)
         self.open_button.clicked.connect(self.open_file)
 
+        # Botão para selecionar uma pasta inteira (modo corpus)
+        self.open_corpus_button = QPushButton('Selecionar Pasta de Áudio (Corpus)', self)
+        self.open_corpus_button.clicked.connect(self.open_corpus)
+
+        # Botão para abrir rodadas pré-renderizadas (python round_bank.py pan ...), tocadas direto do arquivo
+        self.open_bank_button = QPushButton('Abrir Banco de Rodadas', self)
+        self.open_bank_button.clicked.connect(self.open_bank)
+
         # Botão para reproduzir áudio original
         self.play_original_button = QPushButton('Reproduzir Áudio Original', self)
         self.play_original_button.clicked.connect(self.play_original)
@@ -42,6 +56,17 @@ class PanningTrainingApp(QWidget):
         self.new_clip_button.clicked.connect(self.new_clip)
         self.new_clip_button.setEnabled(False)
 
+        # Exercício com o arquivo inteiro, renderizado em blocos enquanto toca
+        self.full_song_checkbox = QCheckBox('Exercício com a Música Inteira', self)
+        self.full_song_checkbox.toggled.connect(self.toggle_full_song)
+
+        # Lei de panning usada nos exercícios
+        self.pan_law_label = QLabel('Lei de Panning:')
+        self.pan_law_box = QComboBox()
+        self.pan_law_box.addItems(['Potência Constante (-3 dB)', '-4.5 dB', 'Linear (Original)'])
+        self.pan_law_box.setCurrentIndex(PAN_LAWS.index(DEFAULT_PAN_LAW))
+        self.pan_law_box.currentIndexChanged.connect(self.change_pan_law)
+
         # Slider para que o usuário selecione o panning estimado
         self.panning_slider = QSlider(Qt.Horizontal)
         self.panning_slider.setMinimum(-100)
@@ -73,6 +98,8 @@ class PanningTrainingApp(QWidget):
         # Layout
         layout = QVBoxLayout()
         layout.addWidget(self.open_button)
+        layout.addWidget(self.open_corpus_button)
+        layout.addWidget(self.open_bank_button)
 
         h_layout = QHBoxLayout()
         h_layout.addWidget(self.play_original_button)
@@ -80,6 +107,13 @@ class PanningTrainingApp(QWidget):
         layout.addLayout(h_layout)
 
         layout.addWidget(self.new_clip_button)
+        layout.addWidget(self.full_song_checkbox)
+
+        law_layout = QHBoxLayout()
+        law_layout.addWidget(self.pan_law_label)
+        law_layout.addWidget(self.pan_law_box)
+        layout.addLayout(law_layout)
+
         layout.addWidget(self.slider_label)
         layout.addWidget(self.panning_slider)
 
@@ -92,61 +126,49 @@ class PanningTrainingApp(QWidget):
         layout.addWidget(self.check_button)
 
         self.setLayout(layout)
-        self.show()
-
-    def open_file(self):
-        options = QFileDialog.Options()
-        fileName, _ = QFileDialog.getOpenFileName(self, "Selecionar Arquivo de Áudio", "",
-                                                  "Arquivos de Áudio (*.wav *.flac *.ogg)", options=options)
-        if fileName:
-            self.full_audio_data, self.sample_rate = sf.read(fileName)
-            if len(self.full_audio_data.shape) > 1:
-                self.full_audio_data = np.mean(self.full_audio_data, axis=1)
-            
-            self.new_clip()
-            self.play_original_button.setEnabled(True)
-            self.play_panned_button.setEnabled(True)
-            self.new_clip_button.setEnabled(True)
-            self.check_button.setEnabled(True)
-            QMessageBox.information(self, 'Arquivo Carregado', 'O arquivo de áudio foi carregado e modificado.')
 
-    def new_clip(self):
-        max_start = max(0, len(self.full_audio_data) - 5 * self.sample_rate)
-        if max_start <= 0:
-            self.clip_start = 0
-        else:
-            self.clip_start = np.random.randint(0, max_start)
-        clip_end = self.clip_start + 5 * self.sample_rate
-        self.audio_data = self.full_audio_data[int(self.clip_start):int(clip_end)]
-        if len(self.audio_data) < 5 * self.sample_rate:
-            self.audio_data = np.pad(self.audio_data, (0, int(5 * self.sample_rate - len(self.audio_data))), 'constant')
-        self.original_clip = self.audio_data.copy()
-        self.apply_random_panning()
-
-    def apply_random_panning(self):
-        # Gera uma posição de panning aleatória entre -100 e 100
-        self.panning_position = np.random.randint(-100, 101)
-        
-        # Calcula os níveis de volume para cada canal
-        left_gain = max(0, (100 - self.panning_position) / 100)
-        right_gain = max(0, (100 + self.panning_position) / 100)
+    def start_session(self, source):
+        self.set_source(source)
+        # Descarta as rodadas preparadas para a sessão anterior
+        self.prefetch_rounds(partial(pan_round, self.audio_source, engine=self.pan_engine))
+        # Um banco só tem as rodadas gravadas nele, com a lei de panning escolhida ao criá-lo
+        self.full_song_checkbox.setEnabled(self.round_bank is None)
+        self.pan_law_box.setEnabled(self.round_bank is None)
 
-        # Aplica o panning ao áudio
-        self.panned_audio = np.stack((self.audio_data * left_gain, self.audio_data * right_gain), axis=-1)
+        self.new_clip()
+        self.play_original_button.setEnabled(True)
+        self.play_panned_button.setEnabled(True)
+        self.new_clip_button.setEnabled(True)
+        self.check_button.setEnabled(True)
 
-        # Normalização para evitar saturação
-        max_val = np.max(np.abs(self.panned_audio))
-        if max_val > 1.0:
-            self.panned_audio /= max_val
+    def new_clip(self):
+        self.close_stream()
+        if self.full_song_checkbox.isChecked() and hasattr(self.audio_source, 'read'):
+            # A música inteira, com panning aplicado bloco a bloco durante a reprodução (memória constante)
+            round_ = pan_stream_round(self.audio_source, engine=self.pan_engine)
+            self.stream_renderer = round_.original.renderer
+        else:
+            # A porção e o panning aleatório (entre -100 e 100), do banco ou já preparados em segundo plano
+            round_ = self.take_round()
+        self.clip_start = round_.start
+        self.audio_data = round_.original
+        self.original_clip = round_.original
+        self.panning_position = round_.answer
+        self.panned_audio = round_.altered
+        self.player.load(self.sample_rate, original=self.original_clip, panned=self.panned_audio)
+
+    def change_pan_law(self, index):
+        self.pan_engine = PanningEngine(PAN_LAWS[index])
+        # As rodadas já preparadas usam a lei anterior (as de um banco não mudam)
+        if self.audio_source is not None and self.round_bank is None:
+            self.start_session(self.audio_source)
 
     def play_original(self):
-        sd.stop()
-        sd.play(self.original_clip, self.sample_rate)
+        self.player.play('original')
 
     def play_panned(self):
         if self.panned_audio is not None:
-            sd.stop()
-            sd.play(self.panned_audio, self.sample_rate)
+            self.player.play('panned')
 
     def update_slider_label(self):
         value = self.panning_slider.value()
@@ -159,8 +181,14 @@ class PanningTrainingApp(QWidget):
     def check_answer(self):
         user_choice = self.panning_slider.value()
         correct_panning = self.panning_position
+        error = abs(user_choice - correct_panning)
+        # Registra a resposta no histórico
+        source, offset = self.audio_source.locate(self.clip_start)
+        self.resources.results.append('pan', correct_panning, user_choice, error <= self.error_margin,
+                                      error=error, source=source, offset=offset)
+        self.mark_answered()
         # Verifica se o usuário está dentro da margem de erro configurada
-        if abs(user_choice - correct_panning) <= self.error_margin:
+        if error <= self.error_margin:
             QMessageBox.information(self, 'Resultado',
                                     f'Parabéns! Você acertou a posição do panning.\nPanning correto: {correct_panning}%')
         else:
@@ -173,5 +201,6 @@ class PanningTrainingApp(QWidget):
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     ex = PanningTrainingApp()
+    ex.show()
     sys.exit(app.exec_())
 
@@ -0,0 +1,192 @@
+import threading
+from time import perf_counter
+import numpy as np
+from instrumentation import timings
+
+# Frames per callback; small blocks keep the start and switch latency low
+DEFAULT_BLOCK_SIZE = 256
+# Length of the crossfade when switching between buffers, in seconds
+DEFAULT_CROSSFADE = 0.005
+
+
+def _sounddevice_stream(**kwargs):
+    import sounddevice as sd
+    return sd.OutputStream(latency='low', **kwargs)
+
+
+class NullOutputStream:
+    """
+    Stand-in for ``sounddevice.OutputStream`` that drives no audio device.
+
+    The callback only runs when ``pull`` is called, which makes the
+    playback engine testable without PortAudio.
+    """
+
+    def __init__(self, samplerate, blocksize, channels, dtype, callback):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.channels = channels
+        self.dtype = dtype
+        self.callback = callback
+        self.active = False
+        self.closed = False
+
+    def start(self):
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+    def close(self):
+        self.active = False
+        self.closed = True
+
+    def pull(self):
+        """Run the callback for one block and return what it wrote."""
+        outdata = np.zeros((self.blocksize, self.channels), dtype=self.dtype)
+        self.callback(outdata, self.blocksize, None, None)
+        return outdata
+
+
+class PlaybackEngine:
+    """
+    Persistent output stream that plays named buffers and switches between them at the playhead.
+
+    Buffers are arrays, or streamed signals (anything with ``ready``, ``read``
+    and ``len``, see ``streaming``) rendered while they play.
+
+    The stream is opened once per sample rate and keeps running, writing
+    silence while idle, so starting playback does not open a new PortAudio
+    stream. ``play`` with a different buffer while audio is running switches
+    to it at the current playhead with a short crossfade, which is what
+    makes instant A/B comparison possible.
+
+    Parameters:
+    block_size (int): Frames per callback.
+    crossfade (float): Crossfade length in seconds when switching (0 for a hard cut).
+    channels (int): Output channels; mono buffers are sent to every channel.
+    stream_factory (callable): Builds the stream from ``samplerate``, ``blocksize``,
+        ``channels``, ``dtype`` and ``callback`` (default: ``sounddevice.OutputStream``).
+    """
+
+    def __init__(self, block_size=DEFAULT_BLOCK_SIZE, crossfade=DEFAULT_CROSSFADE, channels=2,
+                 stream_factory=_sounddevice_stream):
+        self.block_size = block_size
+        self.crossfade = crossfade
+        self.channels = channels
+        self.stream_factory = stream_factory
+        self.stream = None
+        self.sample_rate = None
+        self._buffers = {}
+        self._current = None
+        self._previous = None  # Buffer being faded out
+        self._fade_frames = 0
+        self._fade_done = 0
+        self._playhead = 0
+        self._playing = False
+        self._requested_at = None  # When play() was called, until the first block goes out
+        self._lock = threading.Lock()
+        self._scratch = np.zeros((block_size, channels), dtype=np.float32)
+
+    def load(self, sample_rate, **buffers):
+        """Stop playback and replace the buffers, e.g. ``load(rate, original=a, altered=b)``."""
+        with self._lock:
+            self._playing = False
+            self._buffers = buffers
+            self._current = self._previous = None
+            self._playhead = 0
+        if self.stream is None or sample_rate != self.sample_rate:
+            self._open(sample_rate)
+
+    def _open(self, sample_rate):
+        if self.stream is not None:
+            self.stream.close()
+        self.sample_rate = sample_rate
+        self._fade_frames = max(1, int(self.crossfade * sample_rate))
+        self.stream = self.stream_factory(samplerate=sample_rate, blocksize=self.block_size,
+                                          channels=self.channels, dtype='float32', callback=self._callback)
+        self.stream.start()
+
+    def play(self, name):
+        """
+        Play buffer `name`.
+
+        If another buffer is playing, switch to `name` at the current playhead;
+        otherwise (or if `name` is already playing) start from the beginning.
+        A stream released by ``close`` is opened again.
+        """
+        if self.stream is None and self.sample_rate is not None:
+            self._open(self.sample_rate)
+        with self._lock:
+            if self._playing and self._current != name:
+                self._previous = self._current
+                self._fade_done = 0
+            else:
+                self._previous = None
+                self._playhead = 0
+            self._current = name
+            self._playing = True
+            if timings.enabled:
+                self._requested_at = perf_counter()
+
+    def stop(self):
+        with self._lock:
+            self._playing = False
+
+    def close(self):
+        """Stop and release the output stream; the buffers are kept for a later ``play``."""
+        self.stop()
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    @property
+    def playhead(self):
+        return self._playhead
+
+    @property
+    def current(self):
+        return self._current if self._playing else None
+
+    def _read(self, name, start, frames, out):
+        """Copy `frames` frames of buffer `name` from `start` into `out`, zero past the end."""
+        buffer = self._buffers[name]
+        if hasattr(buffer, 'read'):
+            # Streamed buffer (see streaming.StreamedSignal)
+            return buffer.read(start, frames, out)
+        available = max(0, min(frames, len(buffer) - start))
+        if buffer.ndim == 1:
+            out[:available] = buffer[start:start + available, np.newaxis]
+        else:
+            out[:available] = buffer[start:start + available]
+        out[available:] = 0
+        return available
+
+    def _callback(self, outdata, frames, time, status):
+        with self._lock:
+            buffer = self._buffers.get(self._current)
+            if not self._playing or (hasattr(buffer, 'ready') and not buffer.ready(self._playhead, frames)):
+                # Idle, or a streamed buffer still rendering: the playhead waits for it
+                outdata.fill(0)
+                return
+            available = self._read(self._current, self._playhead, frames, outdata)
+            if self._requested_at is not None:
+                timings.record('playback.start', perf_counter() - self._requested_at, frames=frames)
+                self._requested_at = None
+            if self._previous is not None:
+                # Fade the previous buffer out and the new one in over the same samples
+                if len(self._scratch) < frames:
+                    self._scratch = np.zeros((frames, self.channels), dtype=np.float32)
+                previous = self._scratch[:frames]
+                self._read(self._previous, self._playhead, frames, previous)
+                ramp = (self._fade_done + np.arange(1, frames + 1, dtype=np.float32)) / self._fade_frames
+                np.minimum(ramp, 1, out=ramp)
+                outdata *= ramp[:, np.newaxis]
+                previous *= (1 - ramp)[:, np.newaxis]
+                outdata += previous
+                self._fade_done += frames
+                if self._fade_done >= self._fade_frames:
+                    self._previous = None
+            self._playhead += frames
+            if available < frames:
+                self._playing = False
@@ -0,0 +1,56 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from instrumentation import timings
+
+# Number of rounds kept ready ahead of the current one
+DEFAULT_DEPTH = 2
+
+
+class RoundPrefetcher:
+    """
+    Prepares upcoming training rounds in a background thread.
+
+    The trainers hand a `prepare` callable (usually one of the functions in
+    ``rounds``) to ``reset``; the prefetcher keeps `depth` calls of it queued
+    on a worker thread, so ``next`` normally returns a finished round without
+    doing any DSP on the Qt event loop.
+
+    Parameters:
+    depth (int): Number of rounds to keep ready.
+    """
+
+    def __init__(self, depth=DEFAULT_DEPTH):
+        self.depth = depth
+        self._prepare = None
+        self._pending = deque()
+        # A single worker keeps the rounds in order and the file reads serial
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def reset(self, prepare):
+        """Drop every queued round and start preparing rounds with `prepare`."""
+        self.cancel()
+        self._prepare = prepare
+        self._fill()
+
+    def _fill(self):
+        while len(self._pending) < self.depth:
+            self._pending.append(self._executor.submit(self._prepare))
+
+    def next(self):
+        """Return the next round, waiting only if it is not ready yet."""
+        future = self._pending.popleft()
+        self._fill()
+        # Time the GUI spends blocked on a round that was not ready yet
+        with timings.stage('round.wait', ready=future.done()):
+            return future.result()
+
+    def cancel(self):
+        """Cancel queued rounds; a round already being rendered finishes and is discarded."""
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._prepare = None
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,125 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from activity_index import ActivityIndex
+from audio_source import ClipSource
+from corpus import CorpusSource, SegmentCache
+from decode_cache import DecodedAudioCache
+from filter_bank import eq_bands
+from ir_cache import IRCache
+from results_log import ResultsLog
+
+
+def open_source(path, cache=None, segment_cache=None, bands=True):
+    """
+    Open `path` as a clip source: a `CorpusSource` for a folder, a `ClipSource` for a file.
+
+    A file gets its activity index (overall, and per EQ band with `bands`)
+    and decodes through `cache` (a `DecodedAudioCache`), when given; a
+    folder keeps its decoded segments in `segment_cache`. Raises ValueError
+    for a folder without audio.
+    """
+    if os.path.isdir(path):
+        return CorpusSource(path, segment_cache=segment_cache)
+    source = ClipSource(path, cache=cache)
+    _index_activity(source, bands)
+    return source
+
+
+def _index_activity(source, bands):
+    source.activity = ActivityIndex.for_source(source, eq_bands(source.sample_rate) if bands else None)
+
+
+class SharedResources:
+    """
+    Audio sources, round banks, caches, prepared IRs and the results log shared by the trainers of one process.
+
+    A file or folder opened by any trainer is opened (and indexed) only once;
+    the other trainers get the same source back. The activity index of a
+    file is built on a background thread (see ``index_activity``), so
+    opening stays as fast as reading its header. IRs prepared for a sample
+    rate are kept in memory, on top of the on-disk `IRCache`. Sources stay
+    open until ``close``.
+
+    Attributes:
+    current (ClipSource or CorpusSource): Source opened most recently, or None.
+    """
+
+    def __init__(self):
+        self.decode_cache = DecodedAudioCache()
+        self.segment_cache = SegmentCache()
+        self.ir_cache = IRCache()
+        self.results = ResultsLog()
+        self.current = None
+        self._sources = {}
+        self._irs = {}
+        # Activity indexes requested so far, by path: True once the EQ bands are included
+        self._indexed = {}
+        # One indexing thread: it reads whole files, so a second one would only compete for the disk
+        self._indexer = ThreadPoolExecutor(max_workers=1)
+
+    def open_file(self, path):
+        """Return the `ClipSource` of `path`; its activity index is requested with ``index_activity``."""
+        key = ('file', path)
+        if key not in self._sources:
+            self._sources[key] = ClipSource(path, cache=self.decode_cache)
+        self.current = self._sources[key]
+        return self.current
+
+    def index_activity(self, source, bands=False):
+        """
+        Build the activity index of `source` (per EQ band too, with `bands`) in the background.
+
+        Until it is ready, clips are drawn uniformly from the whole file. An
+        index with the bands also serves the trainers that do not need them,
+        so each file is indexed at most twice. Folders and round banks have
+        no index.
+        """
+        if not isinstance(source, ClipSource):
+            return
+        requested = self._indexed.get(source.path)
+        # Already requested with the bands, or without them when they are not needed
+        if requested is not None and (requested or not bands):
+            return
+        self._indexed[source.path] = bands
+        self._indexer.submit(_index_activity, source, bands)
+
+    def open_corpus(self, directory):
+        """Return the `CorpusSource` of `directory`; raises ValueError when it holds no audio."""
+        key = ('corpus', directory)
+        if key not in self._sources:
+            self._sources[key] = open_source(directory, segment_cache=self.segment_cache)
+        self.current = self._sources[key]
+        return self.current
+
+    def open_bank(self, path):
+        """
+        Return the `RoundBank` at `path`; raises ValueError when it is not a round bank or holds no rounds.
+
+        A bank belongs to one trainer, so it does not become `current`.
+        """
+        # Imported here: round_bank builds banks with `open_source`
+        from round_bank import RoundBank
+        key = ('bank', path)
+        if key not in self._sources:
+            bank = RoundBank(path)
+            if len(bank) == 0:
+                bank.close()
+                raise ValueError(f"The round bank '{path}' holds no rounds.")
+            self._sources[key] = bank
+        return self._sources[key]
+
+    def prepare_ir(self, path, sample_rate):
+        """Return ``(ir, convolver)`` for the IR at `path`, prepared once per sample rate."""
+        key = (path, sample_rate)
+        if key not in self._irs:
+            self._irs[key] = self.ir_cache.prepare(path, sample_rate)
+        return self._irs[key]
+
+    def close(self):
+        # An index still being built fails on its closed source and is dropped
+        self._indexer.shutdown(wait=False, cancel_futures=True)
+        for source in self._sources.values():
+            source.close()
+        self._sources.clear()
+        self.current = None
+        self.results.close()
@@ -0,0 +1,198 @@
+"""
+Append-only log of every answer given in the trainers, and statistics over it.
+
+Each answer is one fixed-width binary record (`RECORD_DTYPE`, 46 bytes)
+appended to the log, so millions of answers take a few tens of MB. The log
+is read back as a read-only memory map and every statistic is a vectorised
+NumPy reduction over it (``np.bincount``, ``np.cumsum``, ``np.histogram``),
+so a dashboard stays instant as the history grows. Strings that do not fit
+a fixed-width field (reverb names, clip source paths) are stored as ids,
+with a small JSON sidecar mapping them back.
+
+Print a summary of a log with:
+    python results_log.py [--log PATH] [--student NAME]
+"""
+import argparse
+import getpass
+import hashlib
+import json
+import os
+import threading
+import time
+import numpy as np
+from file_utils import write_atomically
+from filter_bank import band_label, eq_bands
+
+DEFAULT_LOG_PATH = os.path.join(os.path.expanduser('~'), '.ear_training', 'results.log')
+TRAINERS = ('eq', 'pan', 'reverb')
+# The fields are packed (no alignment padding) to keep the records small
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),  # Unix time of the answer
+    ('student', 'S16'),
+    ('trainer', 'u1'),  # Index in TRAINERS
+    ('correct', 'u1'),
+    ('answer', '<i2'),  # Band index, pan position or reverb label id
+    ('guess', '<i2'),
+    ('error', '<f4'),  # Absolute pan error (0 for the other trainers)
+    ('source', '<u8'),  # Id of the clip's file (see ResultsLog.sources)
+    ('offset', '<f4'),  # Clip start in that file, in seconds
+])
+
+
+def source_id(path):
+    """Return the 64-bit id stored for the clip source `path`."""
+    return int.from_bytes(hashlib.sha1(os.path.abspath(path).encode()).digest()[:8], 'little')
+
+
+class ResultsLog:
+    """
+    Append-only binary log of training answers.
+
+    Parameters:
+    path (str): Log file; created on first append. Its labels and sources live in ``path + '.json'``.
+    student (str): Student recorded with each answer (default: the login name).
+    """
+
+    def __init__(self, path=DEFAULT_LOG_PATH, student=None):
+        self.path = path
+        self.student = student or getpass.getuser()
+        self._meta_path = path + '.json'
+        self._lock = threading.Lock()
+        self._file = None
+        try:
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        self.labels = meta.get('labels', {})
+        self.sources = meta.get('sources', {})
+
+    def label_id(self, trainer, label):
+        """Return the id of `label` (e.g. a reverb name) for `trainer`, adding it if new."""
+        labels = self.labels.setdefault(trainer, [])
+        if label not in labels:
+            labels.append(label)
+            self._save_meta()
+        return labels.index(label)
+
+    def append(self, trainer, answer, guess, correct, error=0.0, source=None, offset=0.0, timestamp=None,
+               student=None):
+        """Append one answer; `answer`/`guess` are integers (use ``label_id`` for names)."""
+        record = np.zeros(1, dtype=RECORD_DTYPE)
+        record['timestamp'] = time.time() if timestamp is None else timestamp
+        record['student'] = (student or self.student).encode()[:RECORD_DTYPE['student'].itemsize]
+        record['trainer'] = TRAINERS.index(trainer)
+        record['correct'] = bool(correct)
+        record['answer'] = answer
+        record['guess'] = guess
+        record['error'] = error
+        record['offset'] = offset
+        with self._lock:
+            if source is not None:
+                record['source'] = source_id(source)
+                key = str(int(record['source'][0]))
+                if key not in self.sources:
+                    self.sources[key] = os.path.abspath(source)
+                    self._save_meta()
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, 'ab')
+            self._file.write(record.tobytes())
+            self._file.flush()
+
+    def _save_meta(self):
+        write_atomically(self._meta_path, lambda f: json.dump({'labels': self.labels, 'sources': self.sources}, f),
+                         mode='w')
+
+    def records(self):
+        """Return every complete record as a read-only memory map (an empty array for an empty log)."""
+        try:
+            count = os.path.getsize(self.path) // RECORD_DTYPE.itemsize
+        except OSError:
+            count = 0
+        if count == 0:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        # A record cut short by a crash is left out
+        return np.memmap(self.path, dtype=RECORD_DTYPE, mode='r', shape=(count,))
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def select(records, trainer=None, student=None, since=None):
+    """Return the records of `trainer` and `student` answered at or after `since` (Unix time)."""
+    mask = np.ones(len(records), dtype=bool)
+    if trainer is not None:
+        mask &= records['trainer'] == TRAINERS.index(trainer)
+    if student is not None:
+        mask &= records['student'] == student.encode()
+    if since is not None:
+        mask &= records['timestamp'] >= since
+    return records[mask]
+
+
+def accuracy_by_answer(records, n_answers):
+    """Return ``(answered, accuracy)`` per correct answer (e.g. per EQ band); accuracy is NaN when unanswered."""
+    answered = np.bincount(records['answer'], minlength=n_answers)[:n_answers]
+    correct = np.bincount(records['answer'], weights=records['correct'], minlength=n_answers)[:n_answers]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return answered, correct / answered
+
+
+def confusion_matrix(records, n_answers):
+    """Return the ``(answer, guess)`` count matrix of `records`."""
+    keys = records['answer'].astype(np.int64) * n_answers + records['guess']
+    return np.bincount(keys, minlength=n_answers * n_answers)[:n_answers * n_answers].reshape(n_answers, n_answers)
+
+
+def error_histogram(records, bins=np.arange(0, 205, 5)):
+    """Return ``(counts, bin_edges)`` of the absolute errors (the pan error distribution)."""
+    return np.histogram(records['error'], bins=bins)
+
+
+def rolling_accuracy(records, window=50):
+    """Return the accuracy over each run of `window` consecutive answers."""
+    if len(records) < window:
+        return np.zeros(0)
+    cumulative = np.concatenate(([0], np.cumsum(records['correct'], dtype=np.int64)))
+    return (cumulative[window:] - cumulative[:-window]) / window
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise an ear training results log.")
+    parser.add_argument('--log', default=DEFAULT_LOG_PATH)
+    parser.add_argument('--student', help="Only this student's answers.")
+    parser.add_argument('--window', type=int, default=50, help="Answers per rolling accuracy point (default: 50).")
+    args = parser.parse_args()
+
+    log = ResultsLog(args.log)
+    records = log.records()
+    for trainer in TRAINERS:
+        answers = select(records, trainer, args.student)
+        if len(answers) == 0:
+            continue
+        trend = rolling_accuracy(answers, args.window)
+        latest = f", last {args.window}: {trend[-1]:.1%}" if len(trend) else ''
+        print(f"{trainer}: {len(answers)} answers, {answers['correct'].mean():.1%} correct{latest}")
+        if trainer == 'eq':
+            bands = eq_bands(44100)
+            answered, accuracy = accuracy_by_answer(answers, len(bands))
+            for band, count, share in zip(bands, answered, accuracy):
+                print(f"  {band_label(band):>16s}  {count:7d}  {share:7.1%}")
+        elif trainer == 'pan':
+            errors = answers['error']
+            print(f"  error  mean {errors.mean():.1f}  p50 {np.percentile(errors, 50):.1f}  "
+                  f"p90 {np.percentile(errors, 90):.1f}")
+        else:
+            names = log.labels.get('reverb', [])
+            matrix = confusion_matrix(answers, len(names))
+            width = max(len(name) for name in names) if names else 0
+            for name, row in zip(names, matrix):
+                print(f"  {name:>{width}s}  " + ' '.join(f"{count:6d}" for count in row))
+
+
+if __name__ == '__main__':
+    main()
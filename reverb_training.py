@@ -1,38 +1,40 @@
+import os
 import sys
-import numpy as np
-import soundfile as sf
-import sounddevice as sd
-from scipy.signal import convolve
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from PyQt5.QtWidgets import (QApplication, QWidget, QPushButton, QLabel, QVBoxLayout,
-                             QFileDialog, QComboBox, QMessageBox)
-
-class ReverbTrainingApp(QWidget):
-    def __init__(self):
+                             QComboBox, QMessageBox, QCheckBox, QHBoxLayout)
+from convolution import IR_LIBRARY
+from rounds import reverb_round
+from trainer_session import TEXTS_EN, TrainerSession
+
+class ReverbTrainingApp(TrainerSession, QWidget):
+    trainer = 'reverb'
+    texts = dict(TEXTS_EN, wrong_bank='This bank does not hold reverb rounds.',
+                 file_loaded=('File Loaded', 'Audio file loaded successfully. Try to guess the reverb type!'),
+                 corpus_loaded=('Corpus Loaded', '{files} audio files found. Try to guess the reverb type!'))
+
+    def __init__(self, resources=None):
         super().__init__()
         
         # Inicializa as variáveis e a biblioteca de IRs antes de configurar a interface
-        self.ir_library = {
-            "Small Room": "IRs/small_room_ir.wav",
-            "Large Hall": "IRs/large_hall_ir.wav",
-            "Church": "IRs/church_ir.wav"
-        }
+        self.ir_library = dict(IR_LIBRARY)
         self.loaded_irs = {}
+        self.convolvers = {}  # IR spectra computed once per IR
+        self.ir_sample_rate = None  # Sample rate loaded_irs were prepared for
+        # Source, round bank, prefetcher and output stream of the session
+        self.init_session(resources)
         self.audio_data = None
-        self.sample_rate = None
         self.reverbed_audio = None  # Inicializa reverbed_audio como None
         self.correct_reverb = None  # Tipo de reverb correto
-        self.clip_start = 0  # Inicializa o ponto inicial do clipe
+        self.render_pool = ThreadPoolExecutor()  # Renders every IR at once in compare-all mode
+        self.reverb_variants = None  # Clip rendered through each IR (compare-all mode)
 
-        # Carregar IRs
-        for name, path in self.ir_library.items():
-            try:
-                ir_data, ir_sample_rate = sf.read(path)
-                # Converter IR para mono se estiver em estéreo
-                if ir_data.ndim > 1:
-                    ir_data = np.mean(ir_data, axis=1)
-                self.loaded_irs[name] = ir_data
-            except FileNotFoundError:
+        # Verificar IRs; elas são carregadas na taxa de amostragem do arquivo aberto
+        for name, path in list(self.ir_library.items()):
+            if not os.path.exists(path):
                 QMessageBox.warning(self, "Error", f"IR file '{path}' not found.")
+                del self.ir_library[name]
         
         # Configura a interface
         self.initUI()
@@ -44,6 +46,14 @@ class ReverbTrainingApp(QWidget):
         self.open_button = QPushButton('Select Audio File', self)
         self.open_button.clicked.connect(self.open_file)
 
+        # Button to draw clips from a whole folder (corpus mode)
+        self.open_corpus_button = QPushButton('Select Audio Folder (Corpus)', self)
+        self.open_corpus_button.clicked.connect(self.open_corpus)
+
+        # Button to play pre-rendered rounds (python round_bank.py reverb ...) straight from the file
+        self.open_bank_button = QPushButton('Open Round Bank', self)
+        self.open_bank_button.clicked.connect(self.open_bank)
+
         # Button to play original audio
         self.play_original_button = QPushButton('Play Original Audio', self)
         self.play_original_button.clicked.connect(self.play_original)
@@ -54,6 +64,18 @@ class ReverbTrainingApp(QWidget):
         self.play_reverbed_button.clicked.connect(self.play_reverbed)
         self.play_reverbed_button.setEnabled(False)
 
+        # Compare-all mode: render the clip through every IR and play any of them
+        self.compare_all_checkbox = QCheckBox('Compare all reverbs', self)
+        self.compare_all_checkbox.toggled.connect(self.toggle_compare_all)
+
+        self.candidate_selector = QComboBox(self)
+        self.candidate_selector.addItems(list(self.ir_library.keys()))
+        self.candidate_selector.setEnabled(False)
+
+        self.play_candidate_button = QPushButton('Play Candidate', self)
+        self.play_candidate_button.clicked.connect(self.play_candidate)
+        self.play_candidate_button.setEnabled(False)
+
         # ComboBox to let the user guess the reverb type
         self.guess_selector = QComboBox(self)
         self.guess_selector.addItems(list(self.ir_library.keys()))
@@ -67,86 +89,113 @@ class ReverbTrainingApp(QWidget):
         # Layout
         layout = QVBoxLayout()
         layout.addWidget(self.open_button)
+        layout.addWidget(self.open_corpus_button)
+        layout.addWidget(self.open_bank_button)
         layout.addWidget(self.play_original_button)
         layout.addWidget(self.play_reverbed_button)
+        layout.addWidget(self.compare_all_checkbox)
+        compare_layout = QHBoxLayout()
+        compare_layout.addWidget(self.candidate_selector)
+        compare_layout.addWidget(self.play_candidate_button)
+        layout.addLayout(compare_layout)
         layout.addWidget(QLabel("Guess the Reverb Type:"))
         layout.addWidget(self.guess_selector)
         layout.addWidget(self.check_button)
 
         self.setLayout(layout)
-        self.show()
-
-    def open_file(self):
-        options = QFileDialog.Options()
-        fileName, _ = QFileDialog.getOpenFileName(self, "Select Audio File", "",
-                                                  "Audio Files (*.wav *.flac *.ogg)", options=options)
-        if fileName:
-            self.full_audio_data, self.sample_rate = sf.read(fileName)
-            if len(self.full_audio_data.shape) > 1:
-                self.full_audio_data = np.mean(self.full_audio_data, axis=1)  # Convert to mono
-
-            # Select a random 5-second clip
-            self.select_random_clip()
-
-            # Apply a random reverb effect
-            self.apply_random_reverb()
-
-            self.play_original_button.setEnabled(True)
-            self.play_reverbed_button.setEnabled(True)
-            self.guess_selector.setEnabled(True)
-            self.check_button.setEnabled(True)
-            QMessageBox.information(self, 'File Loaded', 'Audio file loaded successfully. Try to guess the reverb type!')
-
-    def select_random_clip(self):
-        # Select a random 5-second clip from the full audio
-        max_start = max(0, len(self.full_audio_data) - 5 * self.sample_rate)
-        if max_start <= 0:
-            self.clip_start = 0
-        else:
-            self.clip_start = np.random.randint(0, max_start)
-        clip_end = self.clip_start + 5 * self.sample_rate
-        self.audio_data = self.full_audio_data[int(self.clip_start):int(clip_end)]
-        if len(self.audio_data) < 5 * self.sample_rate:
-            self.audio_data = np.pad(self.audio_data, (0, int(5 * self.sample_rate - len(self.audio_data))), 'constant')
-
-    def apply_random_reverb(self):
-        # Select a random reverb type
-        self.correct_reverb = np.random.choice(list(self.ir_library.keys()))
-        ir_data = self.loaded_irs.get(self.correct_reverb)
-        
-        if ir_data is not None:
-            # Apply the selected IR to the audio clip
-            self.reverbed_audio = convolve(self.audio_data, ir_data, mode='full')
-            # Normalize to avoid saturation
-            max_val = np.max(np.abs(self.reverbed_audio))
-            if max_val > 1.0:
-                self.reverbed_audio /= max_val
+
+    def start_session(self, source):
+        self.set_source(source)
+        self.prepare_irs()
+        # A bank only holds its recorded rounds, without compare-all candidates
+        self.compare_all_checkbox.setEnabled(self.round_bank is None)
+        self.reset_rounds()
+
+        # Select a random 5-second clip with a random reverb effect
+        self.next_round()
+
+        self.play_original_button.setEnabled(True)
+        self.play_reverbed_button.setEnabled(True)
+        self.guess_selector.setEnabled(True)
+        self.check_button.setEnabled(True)
+
+    def reset_rounds(self):
+        # Drop the rounds prepared for the previous session (or mode)
+        self.prefetch_rounds(partial(reverb_round, self.audio_source, self.convolvers,
+                                     compare_all=self.compare_all_checkbox.isChecked(), executor=self.render_pool))
+
+    def toggle_compare_all(self, checked):
+        self.candidate_selector.setEnabled(checked and self.audio_source is not None)
+        self.play_candidate_button.setEnabled(checked and self.audio_source is not None)
+        # With a bank open, the round on screen is not skipped without an answer
+        if self.audio_source is not None and self.round_bank is None:
+            self.reset_rounds()
+            self.next_round()
+
+    def prepare_irs(self):
+        # Resample the IRs to the session rate; after the first run (in any trainer) this is a cache lookup
+        if self.ir_sample_rate == self.sample_rate:
+            return
+        self.loaded_irs = {}
+        self.convolvers = {}
+        for name, path in self.ir_library.items():
+            self.loaded_irs[name], self.convolvers[name] = self.resources.prepare_ir(path, self.sample_rate)
+        self.ir_sample_rate = self.sample_rate
+
+    def next_round(self):
+        # From the bank, played without a copy from its memory map, or rendered in the background
+        round_ = self.take_round()
+        self.clip_start = round_.start
+        self.audio_data = round_.original
+        self.correct_reverb = round_.answer
+        self.reverbed_audio = round_.altered
+        self.reverb_variants = round_.variants
+        buffers = {'original': self.audio_data, 'reverbed': self.reverbed_audio}
+        if self.reverb_variants is not None:
+            # Every candidate is already rendered, so switching between them is instant
+            buffers.update(('candidate:' + name, variant)
+                           for name, variant in zip(self.convolvers, self.reverb_variants))
+        self.player.load(self.sample_rate, **buffers)
+        self.candidate_selector.setEnabled(self.reverb_variants is not None)
+        self.play_candidate_button.setEnabled(self.reverb_variants is not None)
 
     def play_original(self):
-        sd.stop()
-        sd.play(self.audio_data, self.sample_rate)
+        self.player.play('original')
 
     def play_reverbed(self):
         if self.reverbed_audio is not None:
-            sd.stop()
-            sd.play(self.reverbed_audio[:len(self.audio_data)], self.sample_rate)
+            self.player.play('reverbed')
         else:
             QMessageBox.warning(self, "Error", "Reverb has not been applied. Please load an audio file first.")
 
+    def play_candidate(self):
+        if self.reverb_variants is not None:
+            self.player.play('candidate:' + self.candidate_selector.currentText())
+
     def check_guess(self):
         # Get the user's guess and compare it to the correct reverb
         user_guess = self.guess_selector.currentText()
+        # Keep the answer in the results log
+        results = self.resources.results
+        source, offset = self.audio_source.locate(self.clip_start)
+        results.append('reverb', results.label_id('reverb', self.correct_reverb), results.label_id('reverb', user_guess),
+                       user_guess == self.correct_reverb, source=source, offset=offset)
+        self.mark_answered()
         if user_guess == self.correct_reverb:
             QMessageBox.information(self, "Result", "Correct! You guessed the reverb type.")
         else:
             QMessageBox.information(self, "Result", f"Incorrect. The correct reverb was: {self.correct_reverb}.")
         
-        # Apply a new random reverb for the next round
-        self.select_random_clip()
-        self.apply_random_reverb()
+        # Swap in the next round, already rendered in the background
+        self.next_round()
+
+    def shutdown(self):
+        super().shutdown()
+        self.render_pool.shutdown(wait=False)
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     ex = ReverbTrainingApp()
+    ex.show()
     sys.exit(app.exec_())
 
@@ -0,0 +1,278 @@
+"""
+Pre-rendered round banks: K rounds of one trainer in a single memory-mapped file.
+
+A bank is built ahead of time from an audio file or a folder, and the
+trainers then play its rounds straight from the memory map: no DSP at all
+during the session and the first round is ready as soon as the file is open.
+Each round is flagged in the file once answered, so a session reopened after
+a restart (or a crash) resumes at the next unanswered round.
+
+Layout: a 16-byte prefix (magic, offset of the metadata), page-aligned
+sections (``used`` flags, ``answers`` records, ``original`` and ``altered``
+audio, one row per round) and a JSON metadata trailer. The bank is written
+to a temporary file, with the prefix last, and moved into place only when
+complete, so an interrupted build never leaves a partial bank behind.
+
+Build a bank with:
+    python round_bank.py eq my_corpus/ eq.bank --rounds 200 --seed 0
+    python round_bank.py pan song.wav pan.bank --pan-law compromise
+    python round_bank.py reverb my_corpus/ reverb.bank
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+from audio_source import AUDIO_DTYPE
+from convolution import available_irs
+from decode_cache import DecodedAudioCache
+from file_utils import atomic_path
+from filter_bank import BandFilterBank, eq_bands
+from instrumentation import timings
+from ir_cache import IRCache
+from panning import DEFAULT_PAN_LAW, PAN_LAWS, PanningEngine
+from resources import open_source
+from rounds import BufferRing, Round, eq_round, pan_round, reverb_round
+
+BANK_MAGIC = b'EARBANK1'
+BANK_TRAINERS = ('eq', 'pan', 'reverb')
+# Sections start on page boundaries
+SECTION_ALIGNMENT = 4096
+# The prefix: magic, then the offset of the JSON metadata
+_PREFIX_DTYPE = np.dtype([('magic', 'S8'), ('metadata', '<u8')])
+ANSWER_DTYPE = np.dtype([
+    ('start', '<i8'),  # Clip start in the source (library-wide for a folder)
+    ('answer', '<i4'),  # Band index, pan position or index in the bank's labels
+    ('source', '<u4'),  # Index in the bank's sources
+    ('offset', '<f4'),  # Clip start in that file, in seconds
+])
+
+
+def _align(offset):
+    return -(-offset // SECTION_ALIGNMENT) * SECTION_ALIGNMENT
+
+
+def _section_dtype(name, audio_dtype):
+    return {'used': np.dtype('u1'), 'answers': ANSWER_DTYPE}.get(name, np.dtype(audio_dtype))
+
+
+class RoundBank:
+    """
+    Read side of a round bank file.
+
+    The audio is mapped read-only and ``round`` returns views into the map,
+    so playing a round copies nothing until the output callback reads it.
+    The answered flags are mapped writable and flushed on every
+    ``mark_used``.
+
+    Attributes:
+    trainer (str): One of `BANK_TRAINERS`.
+    sample_rate (int): Sample rate of the rounds.
+    metadata (dict): Everything recorded at build time (source, seed, labels, pan law...).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            prefix = np.fromfile(path, dtype=_PREFIX_DTYPE, count=1)
+        except OSError as e:
+            raise ValueError(f"Cannot open round bank '{path}': {e}") from e
+        if len(prefix) == 0 or prefix['magic'][0] != BANK_MAGIC:
+            raise ValueError(f"'{path}' is not a round bank.")
+        with open(path, 'rb') as f:
+            f.seek(int(prefix['metadata'][0]))
+            self.metadata = json.loads(f.read())
+        self.trainer = self.metadata['trainer']
+        self.sample_rate = self.metadata['sample_rate']
+        self.labels = self.metadata['labels']
+        self.sources = self.metadata['sources']
+        self._used = self._map('used', 'r+')
+        self.answers = self._map('answers', 'r')
+        self.original = self._map('original', 'r')
+        self.altered = self._map('altered', 'r')
+        self._cursor = 0  # Search for the next round from here
+
+    def _map(self, name, mode):
+        offset, shape = self.metadata['sections'][name]
+        return np.memmap(self.path, dtype=_section_dtype(name, self.metadata['dtype']), mode=mode, offset=offset,
+                         shape=tuple(shape))
+
+    def __len__(self):
+        return len(self._used)
+
+    def remaining(self):
+        """Number of rounds not answered yet."""
+        return len(self) - int(np.count_nonzero(self._used))
+
+    def next_unused(self, index=0):
+        """Return the first unanswered round at or after `index`, or None."""
+        unused = np.flatnonzero(self._used[index:] == 0)
+        return index + int(unused[0]) if len(unused) else None
+
+    def round(self, index):
+        """
+        Return round `index` as a `Round` of read-only views into the bank.
+
+        The round's ``start`` is its index in the bank, to pass to ``locate``
+        and ``mark_used``; reverb answers are returned as IR names.
+        """
+        answer = int(self.answers['answer'][index])
+        if self.labels:
+            answer = self.labels[answer]
+        return Round(index, self.original[index], self.altered[index], answer)
+
+    def next(self):
+        """Return the next unanswered round after the last one returned, or None once every round is answered."""
+        index = self.next_unused(self._cursor)
+        if index is None:
+            # Rounds skipped earlier in the session come back before giving up
+            index = self.next_unused()
+        if index is None:
+            return None
+        self._cursor = index + 1
+        return self.round(index)
+
+    def mark_used(self, index):
+        """Flag round `index` as answered, on disk, so it is not served again."""
+        self._used[index] = 1
+        self._used.flush()
+
+    def reset(self):
+        """Clear every answered flag and start again from the first round."""
+        self._used[:] = 0
+        self._used.flush()
+        self._cursor = 0
+
+    def locate(self, index):
+        """Return ``(path, seconds)``: the file and offset the clip of round `index` was taken from."""
+        record = self.answers[index]
+        return self.sources[int(record['source'])], float(record['offset'])
+
+    def close(self):
+        # The maps themselves are released with the last view still playing
+        self._used.flush()
+
+
+def build_bank(path, trainer, prepare, rounds, sample_rate, metadata=None, locate=None, labels=None,
+               dtype=AUDIO_DTYPE):
+    """
+    Render `rounds` rounds with `prepare()` into a new bank at `path` and return it open.
+
+    The shapes of the first round fix those of the bank. `locate(start)` maps
+    a round's start to ``(path, seconds)``. With `labels`, answers are stored
+    as indices in it (reverb names). Nothing is left at `path` if rendering fails.
+    Raises ValueError when `rounds` is below 1: an empty bank could not be played.
+    """
+    if rounds < 1:
+        raise ValueError(f"A round bank needs at least 1 round, not {rounds}.")
+    metadata = dict(metadata or {})
+    first = prepare()
+    sections = {'used': (rounds,), 'answers': (rounds,), 'original': (rounds,) + first.original.shape,
+                'altered': (rounds,) + first.altered.shape}
+    offset = SECTION_ALIGNMENT
+    layout = {}
+    for name, shape in sections.items():
+        layout[name] = (offset, list(shape))
+        offset = _align(offset + int(np.prod(shape)) * _section_dtype(name, dtype).itemsize)
+
+    with atomic_path(path, suffix='.bank') as tmp_file:
+        with open(tmp_file, 'wb') as f:
+            f.truncate(offset)
+
+        def section(name):
+            start, shape = layout[name]
+            return np.memmap(tmp_file, dtype=_section_dtype(name, dtype), mode='r+', offset=start, shape=tuple(shape))
+
+        answers, original, altered = section('answers'), section('original'), section('altered')
+        sources = []
+        round_ = first
+        for index in range(rounds):
+            if index:
+                round_ = prepare()
+            with timings.stage('bank.write', frames=len(round_.original)):
+                original[index] = round_.original
+                altered[index] = round_.altered
+            answer = labels.index(round_.answer) if labels else round_.answer
+            source, seconds = locate(round_.start) if locate is not None else (None, 0.0)
+            if source not in sources:
+                sources.append(source)
+            answers[index] = (round_.start, answer, sources.index(source), seconds)
+        for array in (answers, original, altered):
+            array.flush()
+        del answers, original, altered
+
+        metadata.update(trainer=trainer, sample_rate=sample_rate, rounds=rounds, dtype=np.dtype(dtype).str,
+                        labels=list(labels or []), sources=sources, sections=layout, created=time.time())
+        with open(tmp_file, 'r+b') as f:
+            f.seek(offset)
+            f.write(json.dumps(metadata).encode())
+            f.flush()
+            os.fsync(f.fileno())
+            # The magic goes in last: a bank is only valid once everything else is on disk
+            f.seek(0)
+            f.write(np.array([(BANK_MAGIC, offset)], dtype=_PREFIX_DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+    return RoundBank(path)
+
+
+def build_trainer_bank(path, trainer, corpus, rounds, seed=0, pan_law=DEFAULT_PAN_LAW):
+    """Build a bank of `rounds` rounds of `trainer` from `corpus` (a file or a folder)."""
+    # Only the EQ rounds draw clips per band
+    source = open_source(corpus, cache=DecodedAudioCache(), bands=trainer == 'eq')
+    try:
+        rng = np.random.RandomState(seed)
+        # Each round is copied into the bank before the next one reuses the buffers
+        buffers = BufferRing(1, source.dtype)
+        metadata = {'source': os.path.abspath(corpus), 'seed': seed}
+        labels = None
+        if trainer == 'eq':
+            filter_bank = BandFilterBank(eq_bands(source.sample_rate), source.sample_rate)
+
+            def prepare():
+                return eq_round(source, filter_bank, rng, buffers=buffers)
+        elif trainer == 'pan':
+            engine = PanningEngine(pan_law)
+            metadata['pan_law'] = pan_law
+
+            def prepare():
+                return pan_round(source, rng, buffers=buffers, engine=engine)
+        elif trainer == 'reverb':
+            cache = IRCache()
+            convolvers = {name: cache.prepare(ir_path, source.sample_rate)[1]
+                          for name, ir_path in available_irs().items()}
+            labels = list(convolvers)
+
+            def prepare():
+                return reverb_round(source, convolvers, rng, buffers=buffers)
+        else:
+            raise ValueError(f"Unknown trainer '{trainer}'; expected one of {BANK_TRAINERS}.")
+        return build_bank(path, trainer, prepare, rounds, source.sample_rate, metadata, source.locate, labels,
+                          source.dtype)
+    finally:
+        source.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render the rounds of a trainer into a round bank file.")
+    parser.add_argument('trainer', choices=BANK_TRAINERS)
+    parser.add_argument('corpus', help="Audio file or directory of audio files.")
+    parser.add_argument('bank', help="Round bank file to write.")
+    parser.add_argument('--rounds', type=int, default=100, help="Rounds in the bank (default: 100).")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for reproducible rounds.")
+    parser.add_argument('--pan-law', choices=PAN_LAWS, default=DEFAULT_PAN_LAW,
+                        help=f"Pan law of a panning bank (default: {DEFAULT_PAN_LAW}).")
+    args = parser.parse_args()
+    if args.rounds < 1:
+        parser.error("--rounds must be at least 1")
+
+    start = time.perf_counter()
+    bank = build_trainer_bank(args.bank, args.trainer, args.corpus, args.rounds, args.seed, args.pan_law)
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(args.bank)
+    print(f"{len(bank)} {bank.trainer} rounds in {elapsed:.2f} s, {size / 2 ** 20:.1f} MB at {args.bank}")
+    bank.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+from collections import namedtuple
+import numpy as np
+from audio_source import AUDIO_DTYPE, CLIP_SECONDS
+from convolution import render_all
+from instrumentation import timings
+
+# One training round: the clip, its altered version and the expected answer.
+# `variants` holds extra renders kept with the round (every band for the EQ trainer,
+# every IR in the reverb trainer's compare-all mode).
+Round = namedtuple('Round', ['start', 'original', 'altered', 'answer', 'variants'], defaults=(None,))
+
+
+class RoundBuffers:
+    """Named arrays that one round renders into, reused by later rounds of the same shape."""
+
+    def __init__(self, dtype=AUDIO_DTYPE):
+        self.dtype = np.dtype(dtype)
+        self._arrays = {}
+
+    def get(self, name, shape):
+        array = self._arrays.get(name)
+        if array is None or array.shape != shape:
+            array = self._arrays[name] = np.empty(shape, dtype=self.dtype)
+        return array
+
+
+class BufferRing:
+    """
+    Per-session ring of `RoundBuffers`, handed out one set per rendered round.
+
+    A set is only reused `size` rounds later, so with ``size >= depth + 2`` the
+    rounds queued by the prefetcher, the round on screen and the one that may
+    still be playing never share memory.
+    """
+
+    def __init__(self, size, dtype=AUDIO_DTYPE):
+        self._sets = [RoundBuffers(dtype) for _ in range(size)]
+        self._index = 0
+
+    def next(self):
+        buffers = self._sets[self._index]
+        self._index = (self._index + 1) % len(self._sets)
+        return buffers
+
+
+def buffer_set(buffers, source):
+    """Return the `RoundBuffers` for the next round: from the `BufferRing` `buffers`, or a fresh set."""
+    return buffers.next() if buffers is not None else RoundBuffers(source.dtype)
+
+
+def normalize(audio):
+    """Scale `audio` down in place when its peak exceeds 1.0 and return it."""
+    max_val = max(audio.max(), -audio.min())
+    if max_val > 1.0:
+        audio /= max_val
+    return audio
+
+
+def eq_round(source, filter_bank, rng=np.random, seconds=CLIP_SECONDS, buffers=None):
+    """Pick a clip from `source` and boost a random band of `filter_bank`."""
+    with timings.stage('eq.round'):
+        round_buffers = buffer_set(buffers, source)
+        length = int(seconds * source.sample_rate)
+        # The band is drawn first so the clip can be chosen with energy in that band
+        band = rng.randint(0, len(filter_bank.bands))
+        with timings.stage('clip.read', frames=length):
+            start, clip = source.random_clip(seconds, rng, round_buffers.get('original', (length,)), band)
+        with timings.stage('eq.filter', frames=length, bands=len(filter_bank.sos)):
+            variants = filter_bank.render(clip, round_buffers.get('variants', (len(filter_bank.sos), length)))
+    return Round(start, clip, variants[band], band, variants)
+
+
+def pan_gains(position):
+    """Return the ``(left, right)`` gains of `position` (-100 full left, 100 full right)."""
+    return max(0, (100 - position) / 100), max(0, (100 + position) / 100)
+
+
+def pan_clip(audio, position, out=None):
+    """Pan mono `audio` to `position` (-100 full left, 100 full right) and return a stereo array."""
+    left_gain, right_gain = pan_gains(position)
+    if out is None:
+        out = np.empty((len(audio), 2), dtype=audio.dtype)
+    np.multiply(audio, left_gain, out=out[:, 0], casting='same_kind')
+    np.multiply(audio, right_gain, out=out[:, 1], casting='same_kind')
+    # Avoid clipping
+    return normalize(out)
+
+
+def pan_round(source, rng=np.random, seconds=CLIP_SECONDS, buffers=None, engine=None):
+    """
+    Pick a clip from `source` and pan it to a random position between -100 and 100.
+
+    `engine` (a ``panning.PanningEngine``) selects the pan law; without it the
+    clip is panned with the linear law of `pan_gains`.
+    """
+    with timings.stage('pan.round'):
+        round_buffers = buffer_set(buffers, source)
+        length = int(seconds * source.sample_rate)
+        with timings.stage('clip.read', frames=length):
+            start, clip = source.random_clip(seconds, rng, round_buffers.get('original', (length,)))
+        position = rng.randint(-100, 101)
+        with timings.stage('pan.render', frames=length):
+            if engine is None:
+                panned = pan_clip(clip, position, round_buffers.get('altered', (length, 2)))
+            else:
+                panned = engine.mix(clip[:, np.newaxis], position, out=round_buffers.get('altered', (length, 2)))
+    return Round(start, clip, panned, position)
+
+
+def reverb_round(source, convolvers, rng=np.random, seconds=CLIP_SECONDS, buffers=None,
+                 compare_all=False, executor=None):
+    """
+    Pick a clip from `source` and convolve it with a random IR from `convolvers`.
+
+    With `compare_all`, the clip is rendered through every IR (concurrently
+    on `executor`, when given) and the renders are kept as the round's
+    `variants`, one row per IR in the order of `convolvers`.
+    """
+    with timings.stage('reverb.round'):
+        round_buffers = buffer_set(buffers, source)
+        length = int(seconds * source.sample_rate)
+        with timings.stage('clip.read', frames=length):
+            start, clip = source.random_clip(seconds, rng, round_buffers.get('original', (length,)))
+        names = list(convolvers)
+        name = rng.choice(names)
+        if compare_all:
+            with timings.stage('reverb.convolve_all', frames=length, irs=len(names)):
+                variants = render_all([convolvers[n] for n in names], clip,
+                                      round_buffers.get('variants', (len(names), length)), executor)
+            with timings.stage('normalize', frames=length * len(names)):
+                for variant in variants:
+                    normalize(variant)
+            return Round(start, clip, variants[names.index(name)], name, variants)
+        # Only the samples that will be played are rendered
+        with timings.stage('reverb.convolve', frames=length, partitions=len(convolvers[name].partitions)):
+            reverbed = convolvers[name].render(clip, out=round_buffers.get('altered', (length,)))
+        with timings.stage('normalize', frames=length):
+            normalize(reverbed)
+    return Round(start, clip, reverbed, name)
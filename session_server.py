@@ -0,0 +1,335 @@
+"""
+Headless training server for a room of trainees on one machine.
+
+Serves EQ, panning and reverb rounds over plain HTTP/1.1 (keep-alive), using
+the same rendering code as the desktop trainers. Each connection is one
+training session:
+
+    GET  /round?type=eq|pan|reverb    render a new round; returns its id and answer choices (JSON)
+    GET  /audio/original?format=pcm   stream the clip (chunked; ``pcm`` is float32 LE, or ``flac``)
+    GET  /audio/altered?format=flac   stream the altered clip
+    POST /answer                      grade ``{"guess": ...}`` against the current round (JSON)
+
+Any request may carry ``?student=NAME``; it names the session in the results log (``--results``).
+
+Rendering runs in a thread pool, at most ``--max-renders`` rounds at a time;
+audio is written in chunks and each chunk waits for the socket to drain, so
+a slow client only slows down its own stream.
+
+Example:
+    python session_server.py my_corpus/ --port 8765
+    python load_test.py --port 8765 --clients 30 --rounds 10
+"""
+import argparse
+import asyncio
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+import soundfile as sf
+from convolution import available_irs
+from decode_cache import DecodedAudioCache
+from filter_bank import BandFilterBank, band_label, eq_bands
+from instrumentation import timings
+from ir_cache import IRCache
+from resources import open_source
+from results_log import ResultsLog
+from rounds import BufferRing, eq_round, pan_round, reverb_round
+
+DEFAULT_PORT = 8765
+# Rounds rendered at the same time, whatever the number of sessions
+DEFAULT_MAX_RENDERS = 4
+# Audio is streamed in chunks of this many bytes
+CHUNK_BYTES = 64 * 1024
+# Default tolerance of the panning trainer, in pan units (-100..100)
+DEFAULT_PAN_MARGIN = 10
+ROUND_TYPES = ('eq', 'pan', 'reverb')
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Session:
+    """State of one connection: its random generator, buffers and current round."""
+
+    def __init__(self, seed=None):
+        self.student = None
+        self.rng = np.random.RandomState(seed)
+        # One set for the round being streamed and one for the round being rendered
+        self.buffers = BufferRing(2)
+        self.round = None
+        self.type = None
+        self.rounds = 0
+        self.correct = 0
+
+
+class TrainingServer:
+    """
+    Renders and grades rounds for many concurrent sessions.
+
+    Parameters:
+    source (ClipSource or CorpusSource): Audio the clips are drawn from, shared by every session.
+    max_renders (int): Rounds rendered concurrently.
+    workers (int): Threads of the rendering pool (default: `max_renders`).
+    pan_margin (int): Largest panning error graded as correct.
+    results (ResultsLog): Log every graded answer goes to, or None.
+    """
+
+    def __init__(self, source, max_renders=DEFAULT_MAX_RENDERS, workers=None, pan_margin=DEFAULT_PAN_MARGIN,
+                 results=None):
+        self.source = source
+        self.results = results
+        self.sample_rate = source.sample_rate
+        self.pan_margin = pan_margin
+        self.bands = eq_bands(self.sample_rate)
+        self.filter_bank = BandFilterBank(self.bands, self.sample_rate)
+        ir_cache = IRCache()
+        try:
+            irs = available_irs()
+        except FileNotFoundError:
+            # Reverb rounds are then refused with a 400
+            irs = {}
+        self.convolvers = {name: ir_cache.prepare(path, self.sample_rate)[1] for name, path in irs.items()}
+        self.executor = ThreadPoolExecutor(max_workers=workers or max_renders)
+        self._render_slots = asyncio.Semaphore(max_renders)
+        self.sessions = 0
+
+    def _render(self, session, kind):
+        if kind == 'eq':
+            return eq_round(self.source, self.filter_bank, session.rng, buffers=session.buffers)
+        if kind == 'pan':
+            return pan_round(self.source, session.rng, buffers=session.buffers)
+        return reverb_round(self.source, self.convolvers, session.rng, buffers=session.buffers)
+
+    def _choices(self, kind):
+        if kind == 'eq':
+            return [band_label(band) for band in self.bands]
+        if kind == 'pan':
+            return {'min': -100, 'max': 100, 'margin': self.pan_margin}
+        return list(self.convolvers)
+
+    async def new_round(self, session, kind):
+        if kind not in ROUND_TYPES or (kind == 'reverb' and not self.convolvers):
+            raise HTTPError(400, f"Unknown or unavailable round type '{kind}'.")
+        loop = asyncio.get_running_loop()
+        # Sessions beyond the cap wait here instead of queueing work in the pool
+        async with self._render_slots:
+            with timings.stage('server.render', type=kind):
+                session.round = await loop.run_in_executor(self.executor, self._render, session, kind)
+        session.type = kind
+        session.rounds += 1
+        return {'round': session.rounds, 'type': kind, 'sample_rate': self.sample_rate,
+                'frames': len(session.round.original), 'choices': self._choices(kind)}
+
+    def grade(self, session, guess):
+        """Return the grading of `guess` for the current round of `session`."""
+        if session.round is None:
+            raise HTTPError(409, "No round in progress.")
+        answer = session.round.answer
+        guess = self._parse_guess(session.type, guess)
+        if session.type == 'eq':
+            answer = int(answer)
+            correct = guess == answer
+            result = {'answer': answer, 'label': band_label(self.bands[answer])}
+        elif session.type == 'pan':
+            answer = int(answer)
+            error = abs(guess - answer)
+            correct = error <= self.pan_margin
+            result = {'answer': answer, 'error': error}
+        else:
+            correct = guess == answer
+            result = {'answer': str(answer)}
+        session.correct += bool(correct)
+        if self.results is not None:
+            self._log(session, answer, guess, correct, result.get('error', 0.0))
+        session.round = None
+        return dict(result, correct=bool(correct), score=session.correct, rounds=session.rounds)
+
+    def _parse_guess(self, kind, guess):
+        """
+        Return `guess` converted for a `kind` round: a band index, a whole pan position or a reverb name.
+
+        Pan guesses are rounded and clamped to -100..100; an EQ guess must be
+        a whole band index. Anything else is a 400.
+        """
+        invalid = HTTPError(400, f"Invalid guess {guess!r} for a {kind} round.")
+        if kind == 'reverb':
+            return str(guess)
+        if isinstance(guess, bool):
+            raise invalid
+        try:
+            value = float(guess)
+        except (TypeError, ValueError):
+            raise invalid
+        if not np.isfinite(value):
+            raise invalid
+        if kind == 'pan':
+            return int(min(100, max(-100, round(value))))
+        if not value.is_integer() or not 0 <= value < len(self.bands):
+            raise invalid
+        return int(value)
+
+    def _log(self, session, answer, guess, correct, error):
+        if session.type == 'reverb':
+            answer = self.results.label_id('reverb', answer)
+            guess = self.results.label_id('reverb', guess)
+        source, offset = self.source.locate(session.round.start)
+        self.results.append(session.type, answer, guess, correct, error, source, offset,
+                            student=session.student or 'anonymous')
+
+    def encode(self, audio, fmt):
+        """Return the bytes to stream for `audio`: raw float32 PCM or a FLAC file."""
+        if fmt == 'pcm':
+            return memoryview(np.ascontiguousarray(audio, dtype='<f4')).cast('B')
+        if fmt == 'flac':
+            buffer = io.BytesIO()
+            sf.write(buffer, audio, self.sample_rate, format='FLAC', subtype='PCM_16')
+            return buffer.getbuffer()
+        raise HTTPError(400, f"Unknown audio format '{fmt}'.")
+
+    async def handle(self, reader, writer):
+        """Serve one connection (one session) until the client closes it."""
+        session = Session()
+        self.sessions += 1
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, query, body = request
+                try:
+                    await self._dispatch(session, writer, method, path, query, body)
+                except HTTPError as e:
+                    await _send_json(writer, {'error': str(e)}, e.status)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    async def _dispatch(self, session, writer, method, path, query, body):
+        if 'student' in query:
+            session.student = query['student']
+        if method == 'GET' and path == '/round':
+            await _send_json(writer, await self.new_round(session, query.get('type', 'eq')))
+        elif method == 'GET' and path in ('/audio/original', '/audio/altered'):
+            if session.round is None:
+                raise HTTPError(409, "No round in progress.")
+            audio = session.round.original if path == '/audio/original' else session.round.altered
+            fmt = query.get('format', 'pcm')
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(self.executor, self.encode, audio, fmt)
+            channels = 1 if audio.ndim == 1 else audio.shape[1]
+            await _send_chunked(writer, data, {
+                'Content-Type': 'audio/flac' if fmt == 'flac' else 'application/octet-stream',
+                'X-Sample-Rate': str(self.sample_rate),
+                'X-Channels': str(channels),
+            })
+        elif method == 'POST' and path == '/answer':
+            try:
+                guess = json.loads(body)['guess']
+            except (ValueError, KeyError, TypeError):
+                raise HTTPError(400, 'Expected a JSON body {"guess": ...}.')
+            await _send_json(writer, self.grade(session, guess))
+        else:
+            raise HTTPError(404, f"No route for {method} {path}.")
+
+
+async def _read_request(reader):
+    """Return ``(method, path, query, body)`` of the next request, or None when the client is done."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode('latin-1').split(' ', 2)
+    except ValueError:
+        return None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    body = await reader.readexactly(length) if length else b''
+    url = urlsplit(target)
+    query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+    return method, url.path, query, body
+
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 409: 'Conflict'}
+
+
+def _head(status, headers):
+    lines = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def _send_json(writer, payload, status=200):
+    body = json.dumps(payload).encode()
+    writer.write(_head(status, {'Content-Type': 'application/json', 'Content-Length': len(body)}) + body)
+    await writer.drain()
+
+
+async def _send_chunked(writer, data, headers):
+    writer.write(_head(200, dict(headers, **{'Transfer-Encoding': 'chunked'})))
+    for begin in range(0, len(data), CHUNK_BYTES):
+        chunk = data[begin:begin + CHUNK_BYTES]
+        writer.write(b'%x\r\n' % len(chunk))
+        writer.write(chunk)
+        writer.write(b'\r\n')
+        # Backpressure: wait until the client has taken the previous chunk
+        await writer.drain()
+    writer.write(b'0\r\n\r\n')
+    await writer.drain()
+
+
+async def serve(corpus, host='127.0.0.1', port=DEFAULT_PORT, max_renders=DEFAULT_MAX_RENDERS, workers=None,
+                pan_margin=DEFAULT_PAN_MARGIN, results_path=None, ready=None):
+    """
+    Run the server until cancelled; `ready` (an ``asyncio.Event``) is set once it listens.
+
+    Graded answers are appended to the results log at `results_path`, when given.
+    """
+    results = ResultsLog(results_path) if results_path else None
+    source = open_source(corpus, cache=DecodedAudioCache())
+    training = TrainingServer(source, max_renders, workers, pan_margin, results)
+    server = await asyncio.start_server(training.handle, host, port)
+    print(f"Serving {corpus} on http://{host}:{port} ({training.sample_rate} Hz)")
+    if ready is not None:
+        ready.set()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        training.executor.shutdown(wait=False)
+        if results is not None:
+            results.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve ear training rounds to many trainees over HTTP.")
+    parser.add_argument('corpus', help="Audio file or directory of audio files.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--max-renders', type=int, default=DEFAULT_MAX_RENDERS,
+                        help=f"Rounds rendered at the same time (default: {DEFAULT_MAX_RENDERS}).")
+    parser.add_argument('--workers', type=int, help="Rendering threads (default: --max-renders).")
+    parser.add_argument('--pan-margin', type=int, default=DEFAULT_PAN_MARGIN)
+    parser.add_argument('--results', metavar='PATH', help="Append every graded answer to this results log.")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.corpus, args.host, args.port, args.max_renders, args.workers, args.pan_margin,
+                          args.results))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+import threading
+import numpy as np
+from audio_source import AUDIO_DTYPE
+from instrumentation import timings
+from rounds import Round, pan_gains
+
+# Frames rendered per block
+STREAM_BLOCK_SIZE = 4096
+# Blocks kept rendered ahead of the playhead (and the size of the ring)
+DEFAULT_AHEAD_BLOCKS = 8
+
+
+class PeakLimiter:
+    """
+    Keeps a streamed signal below full scale without knowing its future peak.
+
+    The gain starts at 1.0 and is lowered whenever a block would clip; it
+    never rises again, so there is no pumping. It plays the role of
+    ``rounds.normalize`` for audio that is not rendered in one piece.
+    """
+
+    def __init__(self):
+        self.gain = 1.0
+
+    def __call__(self, block):
+        peak = max(block.max(initial=0), -block.min(initial=0)) * self.gain
+        if peak > 1.0:
+            self.gain /= peak
+        if self.gain != 1.0:
+            block *= self.gain
+        return block
+
+
+class StreamRenderer:
+    """
+    Renders the signals of an exercise block by block, just ahead of playback.
+
+    `blocks(position)` returns an iterator that yields, from exercise frame
+    `position` on, one tuple of blocks per step, with one ``(frames, channels)``
+    or ``(frames,)`` array per name in `names`. A background thread keeps at
+    most `ahead` blocks rendered past the playhead in a fixed ring, so memory
+    does not depend on the length of the exercise and the first block is
+    ready as soon as one block is rendered. The thread starts on first use.
+    Reading before the oldest frame still in the ring (e.g. playing again
+    from the start) restarts the iterator there.
+
+    Parameters:
+    blocks (callable): ``blocks(position)`` -> iterator of block tuples.
+    names (list): Name of each signal in a block tuple.
+    channels (list): Channel count of each signal.
+    frames (int): Length of the exercise.
+    block_size (int): Frames per block; every block but the last is this long.
+    ahead (int): Blocks rendered ahead of the playhead.
+    """
+
+    def __init__(self, blocks, names, channels, frames, block_size=STREAM_BLOCK_SIZE,
+                 ahead=DEFAULT_AHEAD_BLOCKS, dtype=AUDIO_DTYPE):
+        self._blocks = blocks
+        self.names = list(names)
+        self.frames = frames
+        self.block_size = block_size
+        self._ring_frames = ahead * block_size
+        self._rings = [np.zeros((self._ring_frames, n), dtype=dtype) for n in channels]
+        self._first = 0  # Oldest frame still in the ring
+        self._end = 0  # Frames rendered so far
+        self._playhead = 0
+        self._request = 0  # Position to (re)start rendering from, None while rendering
+        self._done = False
+        self._closed = False
+        self._thread = None
+        self._cond = threading.Condition()
+
+    def signal(self, name):
+        """Return the `StreamedSignal` of `name`, to hand to ``PlaybackEngine.load``."""
+        return StreamedSignal(self, self.names.index(name))
+
+    def ready(self, start, frames):
+        """Whether frames ``[start, start + frames)`` are rendered; restarts rendering at `start` when needed."""
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            if start >= self.frames:
+                return True
+            if start < self._first or start > self._end + self.block_size:
+                # Evicted or far ahead: render again from the block holding `start`
+                self._request = self._first = self._end = start - start % self.block_size
+                self._done = False
+            self._playhead = start
+            self._cond.notify()
+            return min(start + frames, self.frames) <= self._end
+
+    def read(self, index, start, frames, out):
+        """Copy rendered frames of signal `index` into `out`, zero past the end; returns the frames copied."""
+        with self._cond:
+            ring = self._rings[index]
+            available = max(0, min(frames, self.frames - start, self._end - start))
+            if start < self._first:
+                available = 0
+            position = start % self._ring_frames
+            head = min(available, self._ring_frames - position)
+            out[:head] = ring[position:position + head]
+            out[head:available] = ring[:available - head]
+        out[available:] = 0
+        return available
+
+    def _wait_for_work(self):
+        # Wait until a restart is requested or the next block fits in the ring without overwriting the playhead
+        while not self._closed and self._request is None and (
+                self._done or self._end + self.block_size - self._playhead > self._ring_frames):
+            self._cond.wait()
+
+    def _run(self):
+        iterator = None
+        while True:
+            with self._cond:
+                self._wait_for_work()
+                if self._closed:
+                    return
+                if self._request is not None:
+                    iterator = iter(self._blocks(self._request))
+                    self._request = None
+                generation = self._end
+            with timings.stage('stream.block', frames=self.block_size):
+                block = next(iterator, None)
+            with self._cond:
+                if self._request is not None or self._end != generation:
+                    # Restarted while this block was rendering
+                    continue
+                if block is None:
+                    self._done = True
+                    continue
+                position = self._end % self._ring_frames
+                for ring, data in zip(self._rings, block):
+                    ring[position:position + len(data)] = data.reshape(len(data), -1)
+                self._end += len(block[0])
+                self._first = max(self._first, self._end - self._ring_frames)
+
+    def close(self):
+        """Stop the rendering thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+
+class StreamedSignal:
+    """One named signal of a `StreamRenderer`, playable by ``PlaybackEngine`` like an array."""
+
+    def __init__(self, renderer, index):
+        self.renderer = renderer
+        self.index = index
+
+    def __len__(self):
+        return self.renderer.frames
+
+    def ready(self, start, frames):
+        return self.renderer.ready(start, frames)
+
+    def read(self, start, frames, out):
+        return self.renderer.read(self.index, start, frames, out)
+
+
+def _exercise_window(source, rng, seconds):
+    """Return ``(start, frames)``: the whole file when `seconds` is None, else a random window."""
+    if seconds is None:
+        return 0, source.frames
+    frames = min(int(seconds * source.sample_rate), source.frames)
+    return rng.randint(0, source.frames - frames + 1), frames
+
+
+def eq_blocks(source, start, frames, sos, gain, position=0, block_size=STREAM_BLOCK_SIZE):
+    """
+    Yield ``(original, altered)`` blocks of an EQ exercise from exercise frame `position`.
+
+    The band-pass runs as a stateful ``sosfilt`` whose state `zi` is carried
+    from block to block, so the result is the same as filtering in one piece.
+    """
+    from scipy.signal import sosfilt
+    zi = np.zeros((len(sos), 2))
+    limiter = PeakLimiter()
+    block = np.empty(block_size, dtype=source.dtype)
+    altered = np.empty(block_size, dtype=source.dtype)
+    for offset in range(position, frames, block_size):
+        n = min(block_size, frames - offset)
+        original = source.read(start + offset, n, block[:n])
+        filtered, zi = sosfilt(sos, original, zi=zi)
+        np.multiply(filtered, gain, out=altered[:n], casting='same_kind')
+        altered[:n] += original
+        yield original, limiter(altered[:n])
+
+
+def pan_blocks(source, start, frames, pan_position, position=0, block_size=STREAM_BLOCK_SIZE, engine=None):
+    """
+    Yield ``(original, panned)`` blocks of a panning exercise from exercise frame `position`.
+
+    The gains come from `engine` (a ``panning.PanningEngine``), or from the linear `pan_gains` without one.
+    """
+    gains = pan_gains(pan_position) if engine is None else engine.gains([pan_position])[0]
+    gains = np.array(gains, dtype=source.dtype)
+    limiter = PeakLimiter()
+    block = np.empty(block_size, dtype=source.dtype)
+    panned = np.empty((block_size, 2), dtype=source.dtype)
+    for offset in range(position, frames, block_size):
+        n = min(block_size, frames - offset)
+        original = source.read(start + offset, n, block[:n])
+        np.multiply(original[:, np.newaxis], gains, out=panned[:n])
+        yield original, limiter(panned[:n])
+
+
+def eq_stream_round(source, filter_bank, rng=np.random, seconds=None, block_size=STREAM_BLOCK_SIZE):
+    """
+    Streamed version of ``rounds.eq_round``: the whole file (or `seconds` of it), rendered while it plays.
+
+    `source` must support ``read`` (a `ClipSource`). The returned round holds
+    `StreamedSignal` objects instead of arrays; close ``round.original.renderer``
+    once the round is done.
+    """
+    band = rng.randint(0, len(filter_bank.bands))
+    start, frames = _exercise_window(source, rng, seconds)
+    sos, gain = filter_bank.sos[band], filter_bank.gain
+    renderer = StreamRenderer(lambda position: eq_blocks(source, start, frames, sos, gain, position, block_size),
+                              ['original', 'altered'], [1, 1], frames, block_size, dtype=source.dtype)
+    return Round(start, renderer.signal('original'), renderer.signal('altered'), band)
+
+
+def pan_stream_round(source, rng=np.random, seconds=None, block_size=STREAM_BLOCK_SIZE, engine=None):
+    """Streamed version of ``rounds.pan_round``; see `eq_stream_round`."""
+    pan_position = rng.randint(-100, 101)
+    start, frames = _exercise_window(source, rng, seconds)
+    renderer = StreamRenderer(lambda position: pan_blocks(source, start, frames, pan_position, position, block_size,
+                                                          engine),
+                              ['original', 'altered'], [1, 2], frames, block_size, dtype=source.dtype)
+    return Round(start, renderer.signal('original'), renderer.signal('altered'), pan_position)
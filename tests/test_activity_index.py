@@ -0,0 +1,63 @@
+import numpy as np
+import soundfile as sf
+from activity_index import ActivityIndex
+from audio_source import ClipSource
+
+SAMPLE_RATE = 8000
+HOP = 800
+WINDOW = 10 * HOP
+
+
+def _energy(active_frames, frames=300):
+    energy = np.zeros(frames)
+    energy[active_frames] = 1.0
+    return energy
+
+
+def _starts(index, band=None, draws=2000):
+    rng = np.random.RandomState(0)
+    return np.array([index.random_start(WINDOW, rng, band) for _ in range(draws)]) // HOP
+
+
+def test_windows_need_mostly_active_frames():
+    index = ActivityIndex(SAMPLE_RATE, HOP, _energy(slice(100, 200)))
+    starts = _starts(index)
+    # A 10-frame window needs 8 active frames: it may stick out of the active part by 2 frames
+    assert starts.min() == 98 and starts.max() == 192
+
+
+def test_band_needs_its_own_content_and_share_of_the_frame():
+    energy = _energy(slice(100, 200))
+    band_energy = np.zeros((len(energy), 2))
+    band_energy[100:200, 0] = 1.0
+    # Band 1 is loud in frames 150-199, and only leakage (-30 dB of the frame) in 100-149
+    band_energy[150:200, 1] = 0.5
+    band_energy[100:150, 1] = 1e-3
+    index = ActivityIndex(SAMPLE_RATE, HOP, energy, band_energy)
+    starts = _starts(index, band=1)
+    assert starts.min() == 148 and starts.max() == 192
+    # Without any active window in a band, the windows active overall are used
+    band_energy[:, 1] = 0
+    index = ActivityIndex(SAMPLE_RATE, HOP, energy, band_energy)
+    assert _starts(index, band=1).min() == 98
+    # An index built without bands ignores the band
+    assert _starts(ActivityIndex(SAMPLE_RATE, HOP, energy), band=1).max() == 192
+
+
+def test_silent_file_has_no_active_window():
+    index = ActivityIndex(SAMPLE_RATE, HOP, np.zeros(300))
+    assert index.random_start(WINDOW) is None
+
+
+def test_built_index_skips_silence(tmp_path):
+    path = str(tmp_path / 'half_silent.wav')
+    audio = np.zeros(30 * SAMPLE_RATE, dtype=np.float32)
+    audio[20 * SAMPLE_RATE:] = 0.1 * np.random.default_rng(0).standard_normal(10 * SAMPLE_RATE)
+    sf.write(path, audio, SAMPLE_RATE, subtype='FLOAT')
+    source = ClipSource(path)
+    source.activity = ActivityIndex.build(source, bands=[(100, 1000), (1000, 3000)])
+    rng = np.random.RandomState(0)
+    for _ in range(50):
+        start, clip = source.random_clip(seconds=1, rng=rng, band=1)
+        assert start >= 20 * SAMPLE_RATE - 0.2 * SAMPLE_RATE
+        assert np.mean(clip ** 2) > 0.005
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from scipy.signal import fftconvolve
+from convolution import PartitionedConvolver, render_all
+
+
+def _signals(ir_length, audio_length, seed=0):
+    rng = np.random.default_rng(seed)
+    ir = rng.standard_normal(ir_length) * np.exp(-np.arange(ir_length) / (ir_length / 4))
+    return ir, rng.standard_normal(audio_length)
+
+
+def test_render_matches_fftconvolve():
+    ir, audio = _signals(3 * 64 + 17, 1000)
+    convolver = PartitionedConvolver(ir, block_size=64)
+    np.testing.assert_allclose(convolver.render(audio), fftconvolve(audio, ir)[:len(audio)], atol=1e-10)
+
+
+@pytest.mark.parametrize('block_size', [1, 8, 14, 27, 64, 100])
+def test_render_matches_fftconvolve_for_any_block_size(block_size):
+    # Sizes like 8 and 14, where 2B - 1 is already a fast FFT length, once left the tail slice a sample short
+    ir, audio = _signals(5 * block_size + 3, 7 * block_size + 5)
+    convolver = PartitionedConvolver(ir, block_size=block_size)
+    np.testing.assert_allclose(convolver.render(audio), fftconvolve(audio, ir)[:len(audio)], atol=1e-10)
+    cached = PartitionedConvolver.from_partitions(convolver.partitions, block_size)
+    np.testing.assert_allclose(cached.render(audio), convolver.render(audio), atol=1e-12)
+
+
+def test_render_with_tail_and_short_audio():
+    ir, audio = _signals(500, 100)
+    convolver = PartitionedConvolver(ir, block_size=64)
+    full = fftconvolve(audio, ir)
+    np.testing.assert_allclose(convolver.render(audio, len(full)), full, atol=1e-10)
+
+
+def test_render_all_matches_render():
+    irs = [_signals(length, 1, seed)[0] for seed, length in enumerate((100, 700, 1300))]
+    convolvers = [PartitionedConvolver(ir, block_size=128) for ir in irs]
+    _, audio = _signals(1, 2000)
+    out = np.empty((len(convolvers), len(audio)))
+    render_all(convolvers, audio, out)
+    for row, convolver in zip(out, convolvers):
+        np.testing.assert_allclose(row, convolver.render(audio), atol=1e-12)
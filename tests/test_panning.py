@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from panning import PAN_LAWS, PAN_POSITIONS, PanningEngine, gain_table, multi_pan_round
+from rounds import pan_gains
+
+
+def _db(gain):
+    return 20 * np.log10(gain)
+
+
+def test_constant_power_keeps_the_power_and_is_3_db_down_at_the_centre():
+    table = gain_table('constant_power')
+    np.testing.assert_allclose(np.sum(table ** 2, axis=1), 1)
+    np.testing.assert_allclose(_db(table[100]), -3.01, atol=0.01)
+
+
+def test_compromise_is_4_5_db_down_at_the_centre():
+    np.testing.assert_allclose(_db(gain_table('compromise')[100]), -4.5, atol=0.05)
+
+
+def test_linear_is_the_original_law():
+    expected = np.array([pan_gains(position) for position in PAN_POSITIONS])
+    np.testing.assert_allclose(gain_table('linear'), expected)
+
+
+@pytest.mark.parametrize('law', PAN_LAWS)
+def test_laws_are_symmetric_and_silent_on_the_far_side(law):
+    table = gain_table(law)
+    np.testing.assert_allclose(table[::-1], table[:, ::-1], atol=1e-12)
+    np.testing.assert_allclose([table[0, 1], table[-1, 0]], 0, atol=1e-12)
+    # Moving right never lowers the right gain
+    assert np.all(np.diff(table[:, 1]) >= 0)
+
+
+def test_unknown_law_is_rejected():
+    with pytest.raises(ValueError):
+        PanningEngine('-4.5dB')
+
+
+def test_mix_pans_mono_stems_with_one_matrix():
+    engine = PanningEngine('constant_power')
+    stems = np.stack([np.full(8, 0.5), np.full(8, 0.25)], axis=1).astype(np.float32)
+    mix = engine.mix(stems, [-100, 40])
+    expected = 0.5 * engine.gains([-100])[0] + 0.25 * engine.gains([40])[0]
+    np.testing.assert_allclose(mix, np.tile(expected, (8, 1)), rtol=1e-6)
+    assert mix.dtype == np.float32
+
+
+def test_stereo_stem_is_balanced_and_never_boosted():
+    engine = PanningEngine('constant_power')
+    # Columns: left and right of one stereo stem
+    matrix = engine.gain_matrix([0], channels=[2])
+    np.testing.assert_allclose(matrix, np.eye(2))
+    matrix = engine.gain_matrix([-100], channels=[2])
+    np.testing.assert_allclose(matrix, [[1, 0], [0, 0]], atol=1e-12)
+
+
+def test_mix_is_scaled_down_instead_of_clipping():
+    engine = PanningEngine('linear')
+    mix = engine.mix(np.ones((4, 3), dtype=np.float32), [100, 100, 100])
+    assert np.max(np.abs(mix)) == pytest.approx(1)
+
+
+class _Source:
+    sample_rate = 1000
+    dtype = np.dtype(np.float32)
+
+    def __init__(self):
+        self.starts = iter(range(0, 100000, 1000))
+
+    def random_clip(self, seconds, rng, out=None, band=None):
+        start = next(self.starts)
+        out[:] = 0.1
+        return start, out
+
+
+def test_multi_pan_round_keeps_every_stem_start():
+    round_ = multi_pan_round(_Source(), n_sources=4, rng=np.random.RandomState(0), seconds=1)
+    assert round_.start == [0, 1000, 2000, 3000]
+    assert round_.original.shape == round_.altered.shape == (1000, 2)
+    assert len(round_.answer) == 4 and np.all(np.abs(round_.answer) <= 100)
+    # The original has every stem at the centre: both channels equal
+    np.testing.assert_allclose(round_.original[:, 0], round_.original[:, 1])
@@ -0,0 +1,63 @@
+import numpy as np
+from playback import NullOutputStream, PlaybackEngine
+
+SAMPLE_RATE = 48000
+BLOCK = 256
+
+
+def _engine(crossfade_frames):
+    player = PlaybackEngine(block_size=BLOCK, crossfade=crossfade_frames / SAMPLE_RATE,
+                            stream_factory=NullOutputStream)
+    frames = 20 * BLOCK
+    player.load(SAMPLE_RATE, a=np.ones(frames, dtype=np.float32), b=-np.ones(frames, dtype=np.float32))
+    return player
+
+
+def test_switch_keeps_playhead_and_crossfades():
+    player = _engine(crossfade_frames=2 * BLOCK)
+    player.play('a')
+    for _ in range(2):
+        assert np.all(player.stream.pull() == 1)
+    assert player.playhead == 2 * BLOCK
+
+    player.play('b')
+    first, second, third = player.stream.pull(), player.stream.pull(), player.stream.pull()
+    # Playback went on from the playhead, not from the start of 'b'
+    assert player.playhead == 5 * BLOCK
+    fade = np.concatenate([first[:, 0], second[:, 0]])
+    # a * (1 - ramp) + b * ramp with a linear ramp over the crossfade
+    ramp = np.arange(1, 2 * BLOCK + 1) / (2 * BLOCK)
+    np.testing.assert_allclose(fade, 1 - 2 * ramp, atol=1e-6)
+    assert np.all(np.diff(fade) < 0)
+    assert np.all(third == -1)
+    assert np.array_equal(first[:, 0], first[:, 1])
+
+
+def test_play_same_buffer_restarts_from_the_beginning():
+    player = _engine(crossfade_frames=BLOCK)
+    player.play('a')
+    player.stream.pull()
+    player.play('a')
+    assert player.playhead == 0
+    assert np.all(player.stream.pull() == 1)
+
+
+def test_stops_at_the_end_and_outputs_silence():
+    player = _engine(crossfade_frames=BLOCK)
+    player.play('a')
+    for _ in range(20):
+        assert np.all(player.stream.pull() == 1)
+    # The first block past the end is silent and stops playback
+    assert np.all(player.stream.pull() == 0)
+    assert player.current is None
+
+
+def test_play_after_close_reopens_the_stream():
+    player = _engine(crossfade_frames=BLOCK)
+    player.play('a')
+    player.stream.pull()
+    player.close()
+    assert player.stream is None and player.current is None
+    player.play('b')
+    assert player.playhead == 0
+    assert np.all(player.stream.pull() == -1)
@@ -0,0 +1,64 @@
+import itertools
+import threading
+from prefetch import RoundPrefetcher
+
+
+def _counter(name, calls=None):
+    count = itertools.count()
+
+    def prepare():
+        value = (name, next(count))
+        if calls is not None:
+            calls.append(value)
+        return value
+    return prepare
+
+
+def test_next_returns_rounds_in_order_and_keeps_depth_queued():
+    calls = []
+    prefetcher = RoundPrefetcher(depth=3)
+    prefetcher.reset(_counter('a', calls))
+    assert [prefetcher.next() for _ in range(4)] == [('a', 0), ('a', 1), ('a', 2), ('a', 3)]
+    assert len(prefetcher._pending) == 3
+    prefetcher.shutdown()
+
+
+def test_reset_drops_the_rounds_of_the_previous_session():
+    release = threading.Event()
+    prefetcher = RoundPrefetcher(depth=2)
+    started = threading.Event()
+
+    def blocked():
+        started.set()
+        release.wait()
+        return 'old'
+    prefetcher.reset(blocked)
+    started.wait()
+    calls = []
+    # The round being rendered finishes, but neither it nor the queued one is served
+    prefetcher.reset(_counter('new', calls))
+    release.set()
+    assert [prefetcher.next() for _ in range(3)] == [('new', 0), ('new', 1), ('new', 2)]
+    prefetcher.shutdown()
+
+
+def test_cancel_stops_queued_rounds():
+    release = threading.Event()
+    started = threading.Event()
+    calls = []
+
+    def prepare():
+        calls.append(None)
+        started.set()
+        release.wait()
+        return 'round'
+    prefetcher = RoundPrefetcher(depth=3)
+    prefetcher.reset(prepare)
+    started.wait()
+    pending = list(prefetcher._pending)
+    prefetcher.cancel()
+    release.set()
+    assert pending[0].result() == 'round'
+    assert all(future.cancelled() for future in pending[1:])
+    assert len(calls) == 1 and len(prefetcher._pending) == 0
+    prefetcher.shutdown()
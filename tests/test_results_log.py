@@ -0,0 +1,64 @@
+import numpy as np
+from results_log import (RECORD_DTYPE, ResultsLog, accuracy_by_answer, confusion_matrix, error_histogram,
+                         rolling_accuracy, select)
+
+
+def _log(tmp_path):
+    log = ResultsLog(str(tmp_path / 'results.log'), student='ana')
+    # (answer, guess) EQ answers: band 0 twice right, band 1 once right once wrong, band 3 wrong
+    for timestamp, (answer, guess) in enumerate([(0, 0), (1, 1), (0, 0), (1, 2), (3, 1)]):
+        log.append('eq', answer, guess, answer == guess, timestamp=timestamp)
+    log.append('pan', 30, 18, False, error=12, source='song.wav', offset=4.5, timestamp=10, student='bruno')
+    church, hall = log.label_id('reverb', 'Church'), log.label_id('reverb', 'Large Hall')
+    log.append('reverb', church, hall, False, timestamp=11)
+    log.close()
+    return log
+
+
+def test_records_are_46_bytes_and_read_back(tmp_path):
+    log = _log(tmp_path)
+    assert RECORD_DTYPE.itemsize == 46
+    assert (tmp_path / 'results.log').stat().st_size == 7 * 46
+    records = log.records()
+    pan = select(records, 'pan')[0]
+    assert (pan['student'], pan['answer'], pan['guess'], pan['error'], pan['offset']) == (b'bruno', 30, 18, 12, 4.5)
+    # Labels and sources come back from the sidecar
+    reopened = ResultsLog(log.path)
+    assert reopened.labels['reverb'] == ['Church', 'Large Hall']
+    assert reopened.sources[str(int(pan['source']))].endswith('song.wav')
+
+
+def test_a_record_cut_short_is_ignored(tmp_path):
+    log = _log(tmp_path)
+    with open(log.path, 'ab') as f:
+        f.write(b'\0' * 20)
+    assert len(log.records()) == 7
+
+
+def test_select_by_trainer_student_and_time(tmp_path):
+    records = _log(tmp_path).records()
+    assert len(select(records, 'eq')) == 5
+    assert len(select(records, student='bruno')) == 1
+    assert len(select(records, 'eq', 'ana', since=3)) == 2
+
+
+def test_accuracy_by_answer(tmp_path):
+    answered, accuracy = accuracy_by_answer(select(_log(tmp_path).records(), 'eq'), 4)
+    assert list(answered) == [2, 2, 0, 1]
+    np.testing.assert_array_equal(accuracy, [1.0, 0.5, np.nan, 0.0])
+
+
+def test_confusion_matrix(tmp_path):
+    matrix = confusion_matrix(select(_log(tmp_path).records(), 'eq'), 4)
+    expected = np.zeros((4, 4), dtype=int)
+    for answer, guess in [(0, 0), (1, 1), (0, 0), (1, 2), (3, 1)]:
+        expected[answer, guess] += 1
+    np.testing.assert_array_equal(matrix, expected)
+
+
+def test_rolling_accuracy_and_error_histogram(tmp_path):
+    records = _log(tmp_path).records()
+    np.testing.assert_allclose(rolling_accuracy(select(records, 'eq'), window=2), [1.0, 1.0, 0.5, 0.0])
+    assert len(rolling_accuracy(records, window=50)) == 0
+    counts, edges = error_histogram(select(records, 'pan'))
+    assert counts.sum() == 1 and counts[np.searchsorted(edges, 12, side='right') - 1] == 1
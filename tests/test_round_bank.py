@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from round_bank import RoundBank, build_bank
+from rounds import Round
+
+SAMPLE_RATE = 8000
+
+
+def _prepare():
+    count = iter(range(1000))
+
+    def prepare():
+        index = next(count)
+        clip = np.full(100, index, dtype=np.float32)
+        return Round(index * 100, clip, -clip, index % 3)
+    return prepare
+
+
+def test_rounds_and_answers_are_stored(tmp_path):
+    bank = build_bank(str(tmp_path / 'eq.bank'), 'eq', _prepare(), 4, SAMPLE_RATE)
+    assert (len(bank), bank.trainer, bank.sample_rate) == (4, 'eq', SAMPLE_RATE)
+    round_ = bank.round(2)
+    assert round_.start == 2 and round_.answer == 2
+    assert np.all(round_.original == 2) and np.all(round_.altered == -2)
+
+
+def test_reopened_bank_resumes_at_the_next_unanswered_round(tmp_path):
+    path = str(tmp_path / 'eq.bank')
+    bank = build_bank(path, 'eq', _prepare(), 4, SAMPLE_RATE)
+    assert bank.next().start == 0
+    bank.mark_used(0)
+    assert bank.next().start == 1  # Shown but never answered
+    bank.close()
+
+    reopened = RoundBank(path)
+    assert reopened.remaining() == 3
+    assert reopened.next().start == 1
+    for index in (1, 2, 3):
+        reopened.mark_used(index)
+    assert reopened.remaining() == 0 and reopened.next() is None
+    reopened.reset()
+    assert reopened.remaining() == 4 and reopened.next().start == 0
+
+
+def test_labels_map_answers_to_names(tmp_path):
+    labels = ['Small Room', 'Large Hall', 'Church']
+
+    def prepare(rounds=_prepare()):
+        round_ = rounds()
+        return round_._replace(answer=labels[round_.answer])
+    bank = build_bank(str(tmp_path / 'reverb.bank'), 'reverb', prepare, 3, SAMPLE_RATE, labels=labels)
+    assert [bank.round(index).answer for index in range(3)] == labels
+
+
+def test_empty_bank_is_rejected_and_failed_build_leaves_nothing(tmp_path):
+    with pytest.raises(ValueError):
+        build_bank(str(tmp_path / 'empty.bank'), 'eq', _prepare(), 0, SAMPLE_RATE)
+
+    rounds = _prepare()
+
+    def failing():
+        round_ = rounds()
+        if round_.start:
+            raise RuntimeError('render failed')
+        return round_
+    with pytest.raises(RuntimeError):
+        build_bank(str(tmp_path / 'broken.bank'), 'eq', failing, 3, SAMPLE_RATE)
+    assert list(tmp_path.iterdir()) == []
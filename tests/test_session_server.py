@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+import session_server
+from results_log import ResultsLog, TRAINERS
+from rounds import Round
+from session_server import HTTPError, Session, TrainingServer
+
+SAMPLE_RATE = 44100
+
+
+class _Source:
+    sample_rate = SAMPLE_RATE
+
+    def locate(self, start):
+        return 'clip.wav', start / SAMPLE_RATE
+
+
+def _no_irs():
+    raise FileNotFoundError('no IRs')
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # No reverb IRs: nothing is prepared in the user's IR cache
+    monkeypatch.setattr(session_server, 'available_irs', _no_irs)
+    return TrainingServer(_Source(), results=ResultsLog(str(tmp_path / 'results.log'), student='tester'))
+
+
+def _session(kind, answer):
+    session = Session(seed=0)
+    session.type = kind
+    session.round = Round(SAMPLE_RATE, np.zeros(10), np.zeros(10), answer)
+    session.rounds = 1
+    return session
+
+
+@pytest.mark.parametrize('guess, expected', [('12.6', 13), (-7.4, -7), (40000, 100), ('-1e9', -100)])
+def test_pan_guesses_are_rounded_and_clamped(server, guess, expected):
+    result = server.grade(_session('pan', 95), guess)
+    assert result['error'] == abs(expected - 95)
+    assert result['correct'] == (abs(expected - 95) <= server.pan_margin)
+    record = server.results.records()[-1]
+    assert (TRAINERS[record['trainer']], record['answer'], record['guess']) == ('pan', 95, expected)
+    assert record['offset'] == 1.0
+
+
+@pytest.mark.parametrize('guess', ['abc', None, True, 1.5, -1, 'nan', 'inf', [2]])
+def test_invalid_eq_guess_is_a_400_and_keeps_the_round(server, guess):
+    session = _session('eq', 2)
+    with pytest.raises(HTTPError) as error:
+        server.grade(session, guess)
+    assert error.value.status == 400
+    assert session.round is not None
+    assert len(server.results.records()) == 0
+
+
+def test_eq_guess_out_of_range_is_a_400(server):
+    with pytest.raises(HTTPError) as error:
+        server.grade(_session('eq', 2), len(server.bands))
+    assert error.value.status == 400
+
+
+def test_eq_and_reverb_guesses_are_graded_and_logged(server):
+    session = _session('eq', 2)
+    result = server.grade(session, '2')
+    assert result['correct'] and result['answer'] == 2 and session.round is None
+    result = server.grade(_session('reverb', 'Church'), 'Small Room')
+    assert not result['correct'] and result['answer'] == 'Church'
+    records = server.results.records()
+    assert list(records['guess']) == [2, server.results.label_id('reverb', 'Small Room')]
+    assert records['student'][0] == b'anonymous'
+
+
+def test_grading_without_a_round_is_a_409(server):
+    with pytest.raises(HTTPError) as error:
+        server.grade(Session(), 0)
+    assert error.value.status == 409
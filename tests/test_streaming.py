@@ -0,0 +1,32 @@
+import numpy as np
+import soundfile as sf
+from scipy.signal import sosfilt
+from audio_source import ClipSource
+from filter_bank import BandFilterBank, eq_bands
+from streaming import eq_blocks
+
+SAMPLE_RATE = 44100
+
+
+def _source(tmp_path):
+    path = str(tmp_path / 'noise.wav')
+    audio = 0.05 * np.random.default_rng(0).standard_normal(3 * SAMPLE_RATE)
+    sf.write(path, audio.astype(np.float32), SAMPLE_RATE, subtype='FLOAT')
+    return ClipSource(path)
+
+
+def test_eq_blocks_match_filtering_in_one_piece(tmp_path):
+    source = _source(tmp_path)
+    bank = BandFilterBank(eq_bands(SAMPLE_RATE), SAMPLE_RATE)
+    band = 3
+    start, frames = 1000, 2 * SAMPLE_RATE + 123
+
+    # The blocks are views into reused buffers, so each one is copied as it comes
+    blocks = [(original.copy(), altered.copy())
+              for original, altered in eq_blocks(source, start, frames, bank.sos[band], bank.gain, block_size=4096)]
+    streamed = np.concatenate([altered for _, altered in blocks])
+
+    clip = source.read(start, frames)
+    np.testing.assert_array_equal(np.concatenate([original for original, _ in blocks]), clip)
+    # The carried filter state makes the blocks identical to one sosfilt over the whole window
+    np.testing.assert_allclose(streamed, clip + bank.gain * sosfilt(bank.sos[band], clip), atol=1e-6)
@@ -0,0 +1,162 @@
+from functools import partial
+from PyQt5.QtWidgets import QFileDialog, QMessageBox
+from file_utils import AUDIO_EXTENSIONS
+from playback import PlaybackEngine
+from prefetch import RoundPrefetcher
+from resources import SharedResources
+from round_bank import RoundBank
+from rounds import BufferRing
+
+# Dialog texts of the trainers, in the language of each interface; a trainer adds its
+# own 'wrong_bank' message (and may override any other)
+TEXTS_PT = {
+    'error': 'Erro',
+    'open_file': 'Selecionar Arquivo de Áudio',
+    'audio_files': 'Arquivos de Áudio',
+    'file_loaded': ('Arquivo Carregado', 'O arquivo de áudio foi carregado e modificado.'),
+    'open_corpus': 'Selecionar Pasta de Áudio',
+    'corpus_loaded': ('Corpus Carregado', '{files} arquivos de áudio encontrados.'),
+    'open_bank': 'Abrir Banco de Rodadas',
+    'round_banks': 'Bancos de Rodadas',
+    'bank_loaded': ('Banco Carregado', '{remaining} de {rounds} rodadas por fazer.'),
+    'bank_finished': ('Banco Concluído', 'Todas as rodadas do banco foram feitas; recomeçando.'),
+}
+TEXTS_EN = {
+    'error': 'Error',
+    'open_file': 'Select Audio File',
+    'audio_files': 'Audio Files',
+    'file_loaded': ('File Loaded', 'Audio file loaded successfully.'),
+    'open_corpus': 'Select Audio Folder',
+    'corpus_loaded': ('Corpus Loaded', '{files} audio files found.'),
+    'open_bank': 'Open Round Bank',
+    'round_banks': 'Round Banks',
+    'bank_loaded': ('Bank Loaded', '{remaining} of {rounds} rounds left.'),
+    'bank_finished': ('Bank Finished', 'Every round of the bank was answered; starting over.'),
+}
+
+
+class TrainerSession:
+    """
+    Session handling shared by the trainer widgets, mixed in before ``QWidget``.
+
+    Opens an audio file, a folder (corpus mode) or a round bank through the
+    `SharedResources`, hands out the session's rounds (from the bank, or
+    prepared in the background by the prefetcher) and owns the playback
+    engine. A trainer sets `trainer` (the rounds it plays from a bank) and
+    `texts`, calls ``init_session`` from its constructor and implements
+    ``start_session(source)``. The activity index of an opened file is
+    built in the background; per EQ band only for trainers that set
+    `activity_bands`.
+    """
+
+    trainer = None
+    texts = TEXTS_EN
+    # Whether clips are drawn per EQ band, so the activity index needs the bands
+    activity_bands = False
+
+    def init_session(self, resources=None):
+        # Files, caches and prepared IRs shared with the other trainers of the process
+        self.resources = resources if resources is not None else SharedResources()
+        self.audio_source = None
+        self.round_bank = None  # Pre-rendered round bank, when one is open
+        self.sample_rate = None
+        self.clip_start = 0
+        self.stream_renderer = None  # Block-by-block render of a full-song exercise
+        # Prepares upcoming rounds in the background
+        self.prefetcher = RoundPrefetcher()
+        # Persistent output stream with instant A/B switching
+        self.player = PlaybackEngine()
+
+    def open_file(self):
+        extensions = ' '.join('*' + extension for extension in AUDIO_EXTENSIONS)
+        fileName, _ = QFileDialog.getOpenFileName(self, self.texts['open_file'], "",
+                                                  f"{self.texts['audio_files']} ({extensions})")
+        if fileName:
+            # Only the header is read; each clip is decoded on demand, and the file is indexed in the background
+            self.start_session(self.resources.open_file(fileName))
+            QMessageBox.information(self, *self.texts['file_loaded'])
+
+    def open_corpus(self):
+        directory = QFileDialog.getExistingDirectory(self, self.texts['open_corpus'])
+        if directory:
+            # Only the headers are read; clips come from any file of the folder
+            try:
+                source = self.resources.open_corpus(directory)
+            except ValueError as e:
+                QMessageBox.warning(self, self.texts['error'], str(e))
+                return
+            self.start_session(source)
+            title, message = self.texts['corpus_loaded']
+            QMessageBox.information(self, title, message.format(files=len(source)))
+
+    def open_bank(self):
+        fileName, _ = QFileDialog.getOpenFileName(self, self.texts['open_bank'], "",
+                                                  f"{self.texts['round_banks']} (*.bank)")
+        if fileName:
+            try:
+                bank = self.resources.open_bank(fileName)
+            except ValueError as e:
+                QMessageBox.warning(self, self.texts['error'], str(e))
+                return
+            if bank.trainer != self.trainer:
+                QMessageBox.warning(self, self.texts['error'], self.texts['wrong_bank'])
+                return
+            self.start_session(bank)
+            title, message = self.texts['bank_loaded']
+            QMessageBox.information(self, title, message.format(remaining=bank.remaining(), rounds=len(bank)))
+
+    def set_source(self, source):
+        """Make `source` (a clip source, a corpus or a round bank) the source of the session."""
+        self.audio_source = source
+        self.round_bank = source if isinstance(source, RoundBank) else None
+        self.sample_rate = source.sample_rate
+        # Until the index is ready, clips are drawn from anywhere in the file
+        self.resources.index_activity(source, self.activity_bands)
+
+    def prefetch_rounds(self, prepare):
+        """Prepare the rounds with ``prepare(buffers=...)`` in the background, dropping those queued before."""
+        if self.round_bank is not None:
+            # The rounds are already rendered in the bank
+            self.prefetcher.cancel()
+            return
+        # float32 buffers reused from round to round (one set per round in flight)
+        buffers = BufferRing(self.prefetcher.depth + 2)
+        self.prefetcher.reset(partial(prepare, buffers=buffers))
+
+    def take_round(self):
+        """Return the next round: from the bank (views into its memory map), or prepared in the background."""
+        if self.round_bank is not None:
+            return self.next_bank_round()
+        return self.prefetcher.next()
+
+    def next_bank_round(self):
+        round_ = self.round_bank.next()
+        if round_ is None:
+            QMessageBox.information(self, *self.texts['bank_finished'])
+            self.round_bank.reset()
+            round_ = self.round_bank.next()
+        return round_
+
+    def mark_answered(self):
+        """Flag the round on screen in the bank, so a reopened bank resumes at the next unanswered round."""
+        if self.round_bank is not None:
+            self.round_bank.mark_used(self.clip_start)
+
+    def close_stream(self):
+        if self.stream_renderer is not None:
+            self.stream_renderer.close()
+            self.stream_renderer = None
+
+    def toggle_full_song(self, checked):
+        # A bank round on screen is not dropped without an answer
+        if self.audio_source is not None and self.round_bank is None:
+            self.new_clip()
+
+    def shutdown(self):
+        self.close_stream()
+        self.prefetcher.shutdown()
+        self.player.close()
+
+    def closeEvent(self, event):
+        self.shutdown()
+        super().closeEvent(event)